@@ -1,39 +1,86 @@
 # app/auth_utils.py
 
+import hashlib
 import os
+import secrets
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 import pyodbc
 
-from app.database import get_db_connection
-from app.models import UserInDB # Asegúrate que UserInDB esté completo en models.py
+from app import queries
+from app.cache import user_cache
+from app.database import run_db
+from app.hashing import hasher, HasherSaturatedError, HASH_RETRY_AFTER
+from app.keys import KeyRing
+from app.mappers import map_row
+from app.metrics import phase
+from app.models import UserInDB, TokenClaims, IntrospectionResult # Asegúrate que UserInDB esté completo en models.py
 from datetime import date # Import date
 
 # --- CONFIGURACIÓN DE SEGURIDAD ---
 
-SECRET_KEY = os.environ.get("SECRET_KEY")
-if not SECRET_KEY:
-    raise RuntimeError("SECRET_KEY no está configurada en las variables de entorno.")
+# HS256 (secreto compartido) por defecto; RS256/ES256 firman con el llavero de
+# JWT_KEYS_DIR y publican las llaves públicas en /.well-known/jwks.json
+ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
 
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# TOKEN_MODE:
+#   "session"   -> tokens de 60 min; cada request compara 'iat' con token_valido_desde.
+#   "stateless" -> tokens cortos validados solo por firma + refresh tokens rotativos.
+#                  La BBDD solo se toca en /auth/refresh (y al cargar el perfil):
+#                  get_current_token_claims e introspect_tokens responden con el token.
+TOKEN_MODE = os.environ.get("TOKEN_MODE", "session")
+if TOKEN_MODE not in ("session", "stateless"):
+    raise RuntimeError(f"TOKEN_MODE inválido: {TOKEN_MODE}")
+STATELESS_TOKENS = TOKEN_MODE == "stateless"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "5" if STATELESS_TOKENS else "60"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+REFRESH_PURGE_INTERVAL = float(os.environ.get("REFRESH_PURGE_INTERVAL", "3600"))  # segundos entre purgas de vencidos
+REFRESH_PURGE_BATCH = 5000
+JWKS_MAX_AGE = int(os.environ.get("JWKS_MAX_AGE", "300"))
+
+SECRET_KEY = None
+key_ring = None
+if ALGORITHM == "HS256":
+    SECRET_KEY = os.environ.get("SECRET_KEY")
+    if not SECRET_KEY:
+        raise RuntimeError("SECRET_KEY no está configurada en las variables de entorno.")
+else:
+    JWT_KEYS_DIR = os.environ.get("JWT_KEYS_DIR")
+    if not JWT_KEYS_DIR:
+        raise RuntimeError("JWT_KEYS_DIR no está configurada en las variables de entorno.")
+    key_ring = KeyRing.from_directory(JWT_KEYS_DIR, ALGORITHM, os.environ.get("JWT_ACTIVE_KID"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login") # Apunta al endpoint de login
 
 
 # --- FUNCIONES DE HASHING ---
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica una contraseña plana contra su hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+def _hashing_saturated() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio ocupado, intente nuevamente en unos segundos.",
+        headers={"Retry-After": HASH_RETRY_AFTER},
+    )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifica una contraseña contra su hash en el ejecutor de bcrypt, esperando en el event loop."""
+    try:
+        with phase("bcrypt"):
+            return await hasher.verify_async(plain_password, hashed_password)
+    except HasherSaturatedError:
+        raise _hashing_saturated()
 
-def get_password_hash(password: str) -> str:
-    """Genera el hash de una contraseña."""
-    return pwd_context.hash(password)
+async def get_password_hash_async(password: str) -> str:
+    """Genera el hash de una contraseña en el ejecutor de bcrypt, esperando en el event loop."""
+    try:
+        with phase("bcrypt"):
+            return await hasher.hash_async(password)
+    except HasherSaturatedError:
+        raise _hashing_saturated()
 
 
 # --- FUNCIONES DE TOKEN JWT ---
@@ -44,80 +91,233 @@ def create_access_token(data: dict):
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     # Añadimos la fecha de emisión ('issued at') en UTC
     to_encode.update({"exp": expire, "iat": datetime.now(timezone.utc)})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with phase("jwt_encode"):
+        if key_ring is not None:
+            return key_ring.sign(to_encode)
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> dict:
+    """Verifica firma y expiración del token. Lanza JWTError si no es válido."""
+    with phase("jwt_decode"):
+        if key_ring is not None:
+            return key_ring.decode(token)
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def warm_up_tokens():
+    """Firma y verifica un token descartable: carga los backends de jose/cryptography y las llaves."""
+    decode_access_token(create_access_token(data={"sub": "calentamiento"}))
+
+def create_refresh_token() -> tuple[str, bytes]:
+    """Genera un refresh token opaco. En la BBDD solo se guarda su SHA-256."""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+def hash_refresh_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def new_refresh_family() -> bytes:
+    """Identificador de la cadena de rotación iniciada en un login."""
+    return secrets.token_bytes(16)
+
+def refresh_token_expiration() -> datetime:
+    # DATETIME2 sin zona: guardamos UTC naive, igual que GETUTCDATE()
+    return datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+def purge_expired_refresh_tokens(conn: pyodbc.Connection) -> int:
+    """Borra los refresh tokens vencidos en lotes cortos (no retiene locks). Devuelve cuántos borró."""
+    total = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            deleted = queries.execute(cursor, queries.PURGE_EXPIRED_REFRESH_TOKENS, REFRESH_PURGE_BATCH).rowcount
+            queries.commit(conn)
+            total += max(deleted, 0)
+            if deleted < REFRESH_PURGE_BATCH:
+                return total
+    finally:
+        cursor.close()
+
+def get_jwks() -> tuple[str, str]:
+    """Devuelve el JWKS serializado y su ETag (vacío con HS256: el secreto nunca se publica)."""
+    if key_ring is not None:
+        return key_ring.jwks_json, key_ring.jwks_etag
+    return '{"keys":[]}', '"empty"'
+
 
 # --- DEPENDENCIA DE AUTENTICACIÓN (CON TOLERANCIA) ---
 
-def get_current_active_user(
-    token: str = Depends(oauth2_scheme),
-    conn: pyodbc.Connection = Depends(get_db_connection)
-) -> UserInDB:
-    """
-    Valida el token JWT, verifica que no sea de una sesión antigua (con tolerancia),
-    y devuelve los datos del usuario activo.
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        token_iat_timestamp: int = payload.get("iat") # Obtenemos 'issued at' como timestamp
-        if user_id is None or token_iat_timestamp is None:
-            raise credentials_exception
-        # Convertimos el timestamp 'iat' a un objeto datetime con zona horaria UTC
-        token_fecha_creacion = datetime.fromtimestamp(token_iat_timestamp, tz=timezone.utc)
+INTROSPECT_CHUNK_SIZE = 1000  # SQL Server admite ~2100 parámetros por sentencia
 
-    except JWTError:
-        raise credentials_exception
 
+def _load_user(conn: pyodbc.Connection, user_id: int) -> Optional[UserInDB]:
+    """Lee el usuario desde la BBDD y lo mapea a UserInDB."""
     cursor = conn.cursor()
     # Traemos todos los campos necesarios, incluyendo token_valido_desde
-    cursor.execute(
-        """
-        SELECT
-            id_usuario, nombres, primer_apellido, segundo_apellido, rut, correo,
-            contrasena, direccion, id_rol, estado, foto_url, genero,
-            fecha_nacimiento, token_valido_desde
-        FROM Usuarios WHERE id_usuario = ?
-        """,
-        int(user_id)
-    )
-    user_record = cursor.fetchone()
+    user_record = queries.execute(cursor, queries.SELECT_USER_BY_ID, user_id).fetchone()
     cursor.close()
 
     if user_record is None:
-        raise credentials_exception
+        return None
+    with phase("model"):
+        return map_row(UserInDB, user_record)
 
-    # --- COMPARACIÓN DE FECHAS CON TOLERANCIA ---
-    db_fecha_valida = None
-    if user_record.token_valido_desde:
-        # Asumimos que DATETIME2 se guarda sin zona, lo tratamos como UTC
-        db_fecha_valida = user_record.token_valido_desde.replace(tzinfo=timezone.utc)
 
-        # Si hay fecha válida Y la diferencia entre el último login y la creación del token
-        # es MAYOR a 2 segundos (es decir, el token es significativamente más viejo), lo invalidamos.
-        if (db_fecha_valida - token_fecha_creacion) > timedelta(seconds=2):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="La sesión ha expirado (inicio de sesión detectado en otro dispositivo)",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    # --- FIN COMPARACIÓN ---
+def _load_users(conn: pyodbc.Connection, user_ids: list[int]) -> dict[int, UserInDB]:
+    """Lee varios usuarios con una consulta IN por bloque en vez de una por id."""
+    users = {}
+    cursor = conn.cursor()
+    for i in range(0, len(user_ids), INTROSPECT_CHUNK_SIZE):
+        chunk = user_ids[i:i + INTROSPECT_CHUNK_SIZE]
+        statement = queries.expand(queries.SELECT_USERS_BY_IDS, len(chunk))
+        for user_record in queries.execute(cursor, statement, *chunk).fetchall():
+            users[user_record.id_usuario] = map_row(UserInDB, user_record)
+    cursor.close()
+    return users
+
 
-    # Mapeamos a UserInDB (asegúrate que el modelo tenga todos estos campos)
-    user_data = dict(zip([column[0] for column in user_record.cursor_description], user_record))
-    # Pyodbc puede devolver None para segundo_apellido y direccion, Pydantic lo maneja
-    user_in_db = UserInDB(**user_data)
+def _session_expired(user_in_db: UserInDB, token_fecha_creacion: datetime) -> bool:
+    """True si el token es anterior al último login del usuario (con tolerancia)."""
+    # En modo stateless la revocación ocurre en /auth/refresh, no aquí
+    if not user_in_db.token_valido_desde or STATELESS_TOKENS:
+        return False
+    # Asumimos que DATETIME2 se guarda sin zona, lo tratamos como UTC
+    db_fecha_valida = user_in_db.token_valido_desde.replace(tzinfo=timezone.utc)
+    # Si la diferencia entre el último login y la creación del token es MAYOR a
+    # 2 segundos (es decir, el token es significativamente más viejo), lo invalidamos.
+    return (db_fecha_valida - token_fecha_creacion) > timedelta(seconds=2)
 
 
+async def get_current_active_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
+    """
+    Valida el token JWT, verifica que no sea de una sesión antigua (con tolerancia),
+    y devuelve los datos del usuario activo. Solo consulta la BBDD si el usuario
+    no está en el caché.
+    """
+    credentials_exception = _credentials_exception()
+
+    try:
+        payload = decode_access_token(token)
+        user_id: str = payload.get("sub")
+        token_iat_timestamp: int = payload.get("iat") # Obtenemos 'issued at' como timestamp
+        if user_id is None or token_iat_timestamp is None:
+            raise credentials_exception
+        # Convertimos el timestamp 'iat' a un objeto datetime con zona horaria UTC
+        token_fecha_creacion = datetime.fromtimestamp(token_iat_timestamp, tz=timezone.utc)
+        user_id_int = int(user_id)
+    except (JWTError, ValueError):
+        raise credentials_exception
+
+    user_in_db = user_cache.get(user_id_int)
+    if user_in_db is None:
+        # Si un login invalida al usuario mientras lo leemos, no reponemos el token_valido_desde viejo
+        generation = user_cache.generation()
+        user_in_db = await run_db(_load_user, user_id_int)
+        if user_in_db is None:
+            raise credentials_exception
+        user_cache.set(user_id_int, user_in_db, generation)
+
+    if _session_expired(user_in_db, token_fecha_creacion):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="La sesión ha expirado (inicio de sesión detectado en otro dispositivo)",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     # Verificamos si el usuario está activo (después de validar el token)
     if user_in_db.estado != 'activo':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuario inactivo o baneado")
 
-    return user_in_db
\ No newline at end of file
+    return user_in_db
+
+
+async def get_current_token_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    """
+    Quién llama y con qué rol, para endpoints que no necesitan el perfil. En modo
+    stateless sale solo del token (firma + expiración), sin tocar la BBDD: un
+    baneo o cambio de rol se aplica al renovar en /auth/refresh. En modo session
+    pasa además por get_current_active_user (revocación por token_valido_desde).
+    """
+    try:
+        claims = TokenClaims(**decode_access_token(token))
+    except (JWTError, ValueError):
+        raise _credentials_exception()
+    if not STATELESS_TOKENS:
+        await get_current_active_user(token)
+    return claims
+
+
+# --- INTROSPECCIÓN EN LOTE ---
+
+def _decode_tokens(tokens) -> dict:
+    decoded = {}
+    for token in set(tokens):
+        try:
+            payload = decode_access_token(token)
+            decoded[token] = (payload, int(payload["sub"]), datetime.fromtimestamp(payload["iat"], tz=timezone.utc))
+        except (JWTError, KeyError, TypeError, ValueError):
+            decoded[token] = None
+    return decoded
+
+
+async def introspect_tokens(tokens: list[str]) -> list[IntrospectionResult]:
+    """
+    Aplica las mismas reglas que get_current_active_user a muchos tokens a la vez:
+    decodifica todos, deduplica los id_usuario y resuelve los que no están en
+    caché con una sola consulta por bloque. En modo stateless, como
+    get_current_token_claims, responde solo con la firma y la expiración.
+    """
+    # Hasta 1000 verificaciones de firma: fuera del event loop
+    decoded = await run_in_threadpool(_decode_tokens, tokens)
+
+    users = {}
+    missing = []
+    # En modo stateless no se leen usuarios: ni la revocación ni el estado se miran aquí
+    user_ids = set() if STATELESS_TOKENS else {entry[1] for entry in decoded.values() if entry is not None}
+    for user_id in user_ids:
+        user_in_db = user_cache.get(user_id)
+        if user_in_db is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user_in_db
+    if missing:
+        generation = user_cache.generation()
+        loaded = await run_db(_load_users, missing)
+        for user_id, user_in_db in loaded.items():
+            user_cache.set(user_id, user_in_db, generation)
+        users.update(loaded)
+
+    results = []
+    for token in tokens:
+        entry = decoded[token]
+        if entry is None:
+            results.append(IntrospectionResult(active=False, reason="invalid_token"))
+            continue
+        payload, user_id, token_fecha_creacion = entry
+        user_in_db = users.get(user_id)
+        if STATELESS_TOKENS:
+            reason = None
+        elif user_in_db is None:
+            reason = "user_not_found"
+        elif _session_expired(user_in_db, token_fecha_creacion):
+            reason = "session_expired"
+        elif user_in_db.estado != 'activo':
+            reason = "inactive_user"
+        else:
+            reason = None
+        results.append(IntrospectionResult(
+            active=reason is None,
+            sub=str(user_id),
+            rol=payload.get("rol"),
+            iat=payload.get("iat"),
+            exp=payload.get("exp"),
+            reason=reason,
+        ))
+    return results
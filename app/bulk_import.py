@@ -0,0 +1,239 @@
+# app/bulk_import.py
+"""
+Importación masiva de usuarios (clientes) desde NDJSON o CSV.
+
+Las filas se procesan en bloques: RUTs validados por lote, duplicados
+consultados con una sola sentencia por bloque, contraseñas hasheadas en
+paralelo e inserción con fast_executemany. Si un bloque falla en la BBDD se
+reintenta fila a fila para informar exactamente qué filas no entraron.
+
+Uso por línea de comandos:
+    python -m app.bulk_import usuarios.ndjson
+    python -m app.bulk_import usuarios.csv --chunk-size 500
+"""
+
+import csv
+import json
+import os
+import sys
+
+if __name__ == "__main__":
+    # Como app.main: los módulos de app leen su configuración al importarse
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+import pyodbc
+
+from app.database import db_connection
+from app.hashing import hasher
+from app.membership import registration_filter
+from app.models import UserCreate, ROLE_CLIENTE, STATUS_ACTIVO
+from app.utils import validar_ruts
+
+# Cada bloque usa un parámetro por fila en las consultas IN (SQL Server admite ~2100)
+BULK_IMPORT_CHUNK_SIZE = min(int(os.environ.get("BULK_IMPORT_CHUNK_SIZE", "500")), 1000)
+# Una línea más larga se informa como error y se descarta (el endpoint tampoco la acumula entera)
+BULK_IMPORT_MAX_LINE_BYTES = int(os.environ.get("BULK_IMPORT_MAX_LINE_BYTES", "65536"))
+
+INSERT_USUARIO = """
+    INSERT INTO Usuarios (rut, nombres, primer_apellido, segundo_apellido, correo, contrasena, direccion, id_rol, estado, genero, fecha_nacimiento, token_valido_desde)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETUTCDATE())
+"""
+INSERT_PERFILES = "INSERT INTO Perfil (id_usuario) SELECT id_usuario FROM Usuarios WHERE rut IN ({})"
+SELECT_EXISTENTES = """
+    SELECT rut, correo FROM Usuarios WHERE rut IN ({0})
+    UNION ALL
+    SELECT rut, correo FROM Usuarios WHERE correo IN ({0})
+"""
+
+
+class BulkImporter:
+    """Acumula filas con feed() y las escribe por bloques con flush()."""
+
+    def __init__(self, fmt: str = "ndjson", chunk_size: int = BULK_IMPORT_CHUNK_SIZE):
+        if fmt not in ("ndjson", "csv"):
+            raise ValueError(f"Formato no soportado: {fmt}")
+        self.fmt = fmt
+        self.chunk_size = max(1, min(chunk_size, 1000))
+        self.inserted = 0
+        self.errors = []
+        self._line_no = 0
+        self._header = None
+        self._pending = []           # (línea, UserCreate)
+        self._seen_ruts = set()      # para detectar duplicados dentro del mismo archivo
+        self._seen_correos = set()
+
+    # --- LECTURA ---
+
+    @staticmethod
+    def _as_text(value):
+        # Para el informe de errores: BulkImportError.rut/correo son Optional[str]
+        return str(value) if isinstance(value, (str, int)) and not isinstance(value, bool) else None
+
+    def _fail(self, line_no: int, error: str, rut: str = None, correo: str = None):
+        self.errors.append({"line": line_no, "rut": rut, "correo": correo, "error": error})
+
+    def _parse(self, text: str):
+        if self.fmt == "ndjson":
+            record = json.loads(text)
+            if not isinstance(record, dict):
+                raise ValueError("Cada línea debe ser un objeto JSON.")
+            return record
+        values = next(csv.reader([text]))
+        if self._header is None:
+            self._header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self._header):
+            raise ValueError(f"Se esperaban {len(self._header)} columnas y llegaron {len(values)}.")
+        # En CSV una celda vacía equivale a un campo opcional ausente
+        return {name: (value if value != "" else None) for name, value in zip(self._header, values)}
+
+    def feed(self, raw: bytes) -> bool:
+        """Procesa una línea del archivo. Devuelve True cuando hay un bloque listo para flush()."""
+        self._line_no += 1
+        line_no = self._line_no
+        if len(raw) > BULK_IMPORT_MAX_LINE_BYTES:
+            self._fail(line_no, f"Línea demasiado larga (máximo {BULK_IMPORT_MAX_LINE_BYTES} bytes).")
+            return False
+        try:
+            text = raw.decode("utf-8-sig" if line_no == 1 else "utf-8").strip()
+            if not text:
+                return False
+            record = self._parse(text)
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            self._fail(line_no, f"Línea ilegible: {e}")
+            return False
+        if record is None:
+            return False
+        try:
+            user = UserCreate(**record)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            self._fail(line_no, detail, self._as_text(record.get("rut")), self._as_text(record.get("correo")))
+            return False
+        self._pending.append((line_no, user))
+        return len(self._pending) >= self.chunk_size
+
+    # --- ESCRITURA ---
+
+    def flush(self):
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+
+        candidates = []
+        for (line_no, user), rut_ok in zip(rows, validar_ruts([user.rut for _, user in rows])):
+            rut_key, correo_key = user.rut.lower(), user.correo.lower()
+            if not rut_ok:
+                self._fail(line_no, "RUT inválido.", user.rut, user.correo)
+            elif rut_key in self._seen_ruts or correo_key in self._seen_correos:
+                self._fail(line_no, "RUT o correo repetido en el archivo.", user.rut, user.correo)
+            else:
+                self._seen_ruts.add(rut_key)
+                self._seen_correos.add(correo_key)
+                candidates.append((line_no, user))
+        if not candidates:
+            return
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                candidates = self._drop_existing(cursor, candidates)
+            finally:
+                cursor.close()
+        if not candidates:
+            return
+
+        # Sin conexión tomada: bcrypt tarda segundos por bloque y el pool lo necesitan los requests.
+        # Si alguien registra el mismo RUT o correo entretanto, el reintento fila a fila lo informa.
+        hashes = hasher.hash_many([user.password for _, user in candidates])
+        params = [
+            (user.rut, user.nombres, user.primer_apellido, user.segundo_apellido, user.correo, hashed,
+             user.direccion, ROLE_CLIENTE, STATUS_ACTIVO, user.genero, user.fecha_nacimiento)
+            for (_, user), hashed in zip(candidates, hashes)
+        ]
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._insert(conn, cursor, params)
+                self.inserted += len(params)
+                for _, user in candidates:
+                    registration_filter.add(user.rut, user.correo)
+            except pyodbc.Error:
+                conn.rollback()
+                self._insert_one_by_one(conn, cursor, candidates, params)
+            finally:
+                cursor.close()
+
+    def _drop_existing(self, cursor, candidates):
+        placeholders = ", ".join("?" * len(candidates))
+        cursor.execute(
+            SELECT_EXISTENTES.format(placeholders),
+            *[user.rut for _, user in candidates], *[user.correo for _, user in candidates]
+        )
+        existing_ruts, existing_correos = set(), set()
+        for row in cursor.fetchall():
+            existing_ruts.add(row.rut.lower())
+            existing_correos.add(row.correo.lower())
+        remaining = []
+        for line_no, user in candidates:
+            if user.rut.lower() in existing_ruts or user.correo.lower() in existing_correos:
+                self._fail(line_no, "El RUT o correo ya está registrado.", user.rut, user.correo)
+            else:
+                remaining.append((line_no, user))
+        return remaining
+
+    def _insert(self, conn, cursor, params):
+        cursor.fast_executemany = True
+        try:
+            cursor.executemany(INSERT_USUARIO, params)
+        finally:
+            cursor.fast_executemany = False
+        # Los RUT del bloque son nuevos, así que identifican justo las filas recién insertadas
+        cursor.execute(INSERT_PERFILES.format(", ".join("?" * len(params))), *[p[0] for p in params])
+        conn.commit()
+
+    def _insert_one_by_one(self, conn, cursor, candidates, params):
+        for (line_no, user), row_params in zip(candidates, params):
+            try:
+                cursor.execute(INSERT_USUARIO, *row_params)
+                cursor.execute(INSERT_PERFILES.format("?"), user.rut)
+                conn.commit()
+                self.inserted += 1
+                registration_filter.add(user.rut, user.correo)
+            except pyodbc.Error as e:
+                conn.rollback()
+                self._fail(line_no, f"Error en BBDD: {e}", user.rut, user.correo)
+
+    def summary(self) -> dict:
+        errors = sorted(self.errors, key=lambda error: error["line"])
+        return {"inserted": self.inserted, "failed": len(errors), "errors": errors}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Importación masiva de usuarios")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("ndjson", "csv"))
+    parser.add_argument("--chunk-size", type=int, default=BULK_IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    importer = BulkImporter(fmt, args.chunk_size)
+    exit_code = 0
+    try:
+        with open(args.path, "rb") as f:
+            for raw_line in f:
+                if importer.feed(raw_line):
+                    importer.flush()
+        importer.flush()
+    except (HTTPException, pyodbc.Error) as e:
+        # Lo ya insertado queda en la BBDD: se informa igual el resumen parcial
+        print(f"Importación interrumpida: {e.detail if isinstance(e, HTTPException) else e}", file=sys.stderr)
+        exit_code = 1
+    print(json.dumps(importer.summary(), ensure_ascii=False, indent=2, default=str))
+    sys.exit(exit_code)
@@ -0,0 +1,110 @@
+# app/cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- CONFIGURACIÓN DEL CACHÉ DE USUARIOS ---
+# USER_CACHE_TTL es la cota de desactualización: un baneo o un login en otro
+# worker/instancia puede tardar hasta este tiempo en reflejarse aquí.
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "30"))
+USER_CACHE_MAX_SIZE = int(os.environ.get("USER_CACHE_MAX_SIZE", "10000"))
+
+
+class TTLCache:
+    """
+    Caché LRU en memoria con expiración por entrada. Thread-safe.
+
+    Para no reponer un valor leído antes de un invalidate() concurrente, quien
+    carga toma generation() antes de leer la fuente y la pasa a set(): si la
+    clave se invalidó después, el set se descarta. Las invalidaciones se
+    recuerdan durante `ttl` segundos; un set con una generación anterior a
+    las ya olvidadas también se descarta (solo cuesta un miss más).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated = OrderedDict()  # key -> (generación, instante) de invalidaciones recientes
+        self._forgotten = 0                # generación más alta ya olvidada
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._stale_sets = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def generation(self) -> int:
+        """Marca a tomar antes de leer el valor de la fuente, para pasarla a set()."""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation: int = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None:
+                invalidated = self._invalidated.get(key)
+                if generation < self._forgotten or (invalidated is not None and invalidated[0] > generation):
+                    self._stale_sets += 1
+                    return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = (self._generation, now)
+            self._invalidated.move_to_end(key)
+            while self._invalidated:
+                oldest_key, (generation, at) = next(iter(self._invalidated.items()))
+                if now - at <= self.ttl:
+                    break
+                del self._invalidated[oldest_key]
+                self._forgotten = max(self._forgotten, generation)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "stale_sets": self._stale_sets,
+            }
+
+
+# UserInDB validados por id_usuario. Se invalida al cambiar token_valido_desde o el rol.
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL)
@@ -1,30 +1,416 @@
 # app/database.py
 
 import pyodbc
+import asyncio
+import contextvars
+import logging
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from fastapi import HTTPException, status
 
+from app.metrics import METRICS_ENABLED, phase, record_phase, registry
+
+logger = logging.getLogger(__name__)
+
 CONNECTION_STRING = os.environ.get("DATABASE_CONNECTION_STRING")
 
+# --- CONFIGURACIÓN DEL POOL ---
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))           # segundos esperando una conexión libre (run_db: cola + pool)
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", "1800"))        # edad máxima de una conexión
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", "30"))    # ping si estuvo ociosa más que esto
+# Hilos del ejecutor de BBDD para endpoints async; por defecto uno por conexión del pool
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", "0")) or None
 
-def get_db_connection():
-    if not CONNECTION_STRING:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="La cadena de conexión a la base de datos no está configurada."
-        )
 
-    conn = None
+class PoolTimeoutError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones thread-safe. Reutiliza conexiones abiertas (LIFO),
+    hace ping a las que llevan tiempo ociosas, recicla las muy antiguas y
+    hace rollback al devolverlas para no filtrar transacciones abiertas.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0, recycle=1800.0, ping_after=30.0):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Tamaños de pool inválidos.")
+        self._connect = connect  # Backend intercambiable: cualquier callable que devuelva una conexión DB-API
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0      # conexiones abiertas (ociosas + en uso)
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Métricas acumuladas
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    # --- CICLO DE VIDA DE CONEXIONES ---
+
+    def _open(self) -> _PooledConnection:
+        with phase("db_connect"):
+            entry = _PooledConnection(self._connect())
+        with self._cond:
+            self._created += 1
+        return entry
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn) -> bool:
+        if METRICS_ENABLED:
+            registry.inc("auth_db_pings_total")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def prefill(self):
+        """Abre conexiones hasta alcanzar min_size."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def acquire(self, timeout: float = None, queued: float = 0.0) -> _PooledConnection:
+        """`queued`: lo que el llamador ya esperó antes de llegar aquí; también cuenta en db_checkout."""
+        start = time.monotonic()
+        deadline = start + (self.timeout if timeout is None else timeout)
+        entry = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("El pool está cerrado.")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError("Tiempo de espera agotado obteniendo una conexión.")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self._checkouts += 1
+            self._wait_total += waited
+            if waited > self._wait_max:
+                self._wait_max = waited
+        record_phase("db_checkout", queued + waited)
+
+        try:
+            if entry is not None:
+                now = time.monotonic()
+                stale = self.recycle and now - entry.created_at > self.recycle
+                if stale or (self.ping_after is not None and now - entry.last_used > self.ping_after
+                             and not self._is_alive(entry.conn)):
+                    self._close_quietly(entry.conn)
+                    with self._cond:
+                        self._discarded += 1
+                    entry = None
+            if entry is None:
+                entry = self._open()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return entry
+
+    def release(self, entry: _PooledConnection, discard: bool = False):
+        if not discard:
+            try:
+                entry.conn.rollback()  # Nunca devolvemos al pool una transacción abierta
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(entry.conn)
+
+    @contextmanager
+    def connection(self, timeout: float = None, queued: float = 0.0):
+        entry = self.acquire(timeout, queued)
+        discard = False
+        try:
+            yield entry.conn
+        except pyodbc.Error:
+            discard = True  # La conexión puede haber quedado inutilizable
+            raise
+        finally:
+            self.release(entry, discard=discard)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "wait_time_total": self._wait_total,
+                "wait_time_max": self._wait_max,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+
+# --- POOL GLOBAL ---
+
+def _pyodbc_connect():
+    return pyodbc.connect(CONNECTION_STRING, autocommit=False)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(connect=None, **options) -> ConnectionPool:
+    """
+    (Re)crea el pool global. `connect` permite usar otro backend (p.ej. un
+    driver falso o SQLite en pruebas y benchmarks); por defecto pyodbc.
+    """
+    global _pool
+    settings = {
+        "min_size": DB_POOL_MIN_SIZE,
+        "max_size": DB_POOL_MAX_SIZE,
+        "timeout": DB_POOL_TIMEOUT,
+        "recycle": DB_POOL_RECYCLE,
+        "ping_after": DB_POOL_PING_AFTER,
+    }
+    settings.update(options)
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(connect or _pyodbc_connect, **settings)
+    if old:
+        old.close()
+    _reset_db_executor()
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        if not CONNECTION_STRING:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="La cadena de conexión a la base de datos no está configurada."
+            )
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _pyodbc_connect,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    recycle=DB_POOL_RECYCLE,
+                    ping_after=DB_POOL_PING_AFTER,
+                )
+    return _pool
+
+
+def warm_up_pool():
+    """Abre las DB_POOL_MIN_SIZE conexiones y hace una consulta trivial (carga el driver ODBC)."""
+    pool = get_pool()
+    pool.prefill()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1").fetchone()
+        cursor.close()
+
+
+def close_pool():
+    """Cierra las conexiones ociosas; las que estén en uso se cierran al devolverse."""
+    pool = _pool
+    if pool is not None:
+        pool.close()
+    _reset_db_executor()
+
+
+def _saturated(kind: str = "pool_timeout") -> HTTPException:
+    registry.inc("auth_db_errors_total", (("kind", kind),))
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Base de datos saturada, intente nuevamente.",
+        headers={"Retry-After": "1"},
+    )
+
+
+@contextmanager
+def db_connection(timeout: float = None, queued: float = 0.0):
+    """Toma una conexión del pool traduciendo los errores de BBDD a HTTP 503."""
+    pool = get_pool()
     try:
-        conn = pyodbc.connect(CONNECTION_STRING, autocommit=False)
-        yield conn
+        with pool.connection(timeout, queued) as conn:
+            yield conn
+    except PoolTimeoutError:
+        raise _saturated()
     except pyodbc.Error as ex:
         sqlstate = ex.args[0]
-        print(f"Error de conexión a SQL Server: {sqlstate}")
+        logger.error("Error de conexión a SQL Server: %s", sqlstate)
+        registry.inc("auth_db_errors_total", (("kind", "driver"),))
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="No se pudo conectar a la base de datos."
         )
+
+
+# --- EJECUTOR DE BBDD PARA ENDPOINTS ASYNC ---
+# pyodbc bloquea, así que cada operación ocupa un hilo mientras espera a SQL
+# Server. En vez de usar el threadpool compartido de Starlette (~40 hilos,
+# uno por request en curso), los endpoints async mandan solo el trabajo de
+# BBDD a este ejecutor, con tantos hilos como conexiones tiene el pool: el
+# resto de los requests espera en el event loop sin ocupar ningún hilo.
+#
+# Solo se entrega al ejecutor un trabajo por hilo libre (_db_slots), así que la
+# espera ocurre en el event loop y DB_POOL_TIMEOUT cubre la cola más el
+# checkout: pasado ese tiempo el request recibe el mismo 503 + Retry-After.
+# Ojo: el recargador del filtro de disponibilidad, el flush de la importación
+# masiva y el calentamiento toman conexiones fuera de este ejecutor; mientras
+# las tienen, los hilos de aquí esperan en acquire() y pueden agotar el tiempo.
+
+_db_executor = None
+_db_executor_lock = threading.Lock()
+_db_slots = None     # (event loop, ejecutor, asyncio.Semaphore con un turno por hilo)
+_db_pending = 0
+_db_queue_timeouts = 0
+
+
+def _get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                workers = DB_EXECUTOR_WORKERS or get_pool().max_size
+                _db_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+    return _db_executor
+
+
+def _reset_db_executor():
+    global _db_executor
+    with _db_executor_lock:
+        old, _db_executor = _db_executor, None
+    if old:
+        old.shutdown(wait=False)
+
+
+def _get_db_slots(loop, executor) -> asyncio.Semaphore:
+    global _db_slots
+    slots = _db_slots
+    if slots is None or slots[0] is not loop or slots[1] is not executor:
+        slots = _db_slots = (loop, executor, asyncio.Semaphore(executor._max_workers))
+    return slots[2]
+
+
+async def run_db(fn, *args):
+    """
+    Ejecuta fn(conn, *args) con una conexión del pool en el ejecutor de BBDD y
+    devuelve su resultado. Los errores se traducen igual que en db_connection().
+    """
+    global _db_pending, _db_queue_timeouts
+    pool = get_pool()
+    loop = asyncio.get_running_loop()
+    executor = _get_db_executor()
+    slots = _get_db_slots(loop, executor)
+    start = time.monotonic()
+    _db_pending += 1
+    try:
+        try:
+            await asyncio.wait_for(slots.acquire(), pool.timeout)
+        except asyncio.TimeoutError:
+            _db_queue_timeouts += 1
+            record_phase("db_checkout", time.monotonic() - start)
+            raise _saturated("queue_timeout")
+        queued = time.monotonic() - start
+
+        def work():
+            with db_connection(max(0.0, pool.timeout - queued), queued) as conn:
+                return fn(conn, *args)
+
+        # copy_context: las fases de métricas del request siguen registrándose desde el hilo
+        context = contextvars.copy_context()
+        try:
+            future = executor.submit(context.run, work)
+        except BaseException:
+            slots.release()
+            raise
+        # El turno se devuelve cuando termina el hilo, aunque el request se haya cancelado antes
+        future.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(slots.release))
+        return await asyncio.wrap_future(future)
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        _db_pending -= 1
+
+
+def db_executor_stats() -> dict:
+    executor = _db_executor
+    workers = executor._max_workers if executor else 0
+    return {"workers": workers, "pending": _db_pending, "queued": max(0, _db_pending - workers),
+            "queue_timeouts": _db_queue_timeouts}
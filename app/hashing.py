@@ -0,0 +1,157 @@
+# app/hashing.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# --- CONFIGURACIÓN DEL EJECUTOR DE HASHING ---
+HASH_EXECUTOR = os.environ.get("HASH_EXECUTOR", "thread")             # "thread" o "process"
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE_SIZE = int(os.environ.get("HASH_QUEUE_SIZE", "32"))        # trabajos en espera además de los que corren
+HASH_RETRY_AFTER = os.environ.get("HASH_RETRY_AFTER", "1")            # segundos sugeridos al cliente en un 503
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# Funciones de módulo para que sean serializables en un ProcessPoolExecutor
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _warm_up() -> bool:
+    # El primer hash inicializa el backend de bcrypt de passlib (en cada proceso)
+    pwd_context.hash("calentamiento")
+    return True
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class HasherSaturatedError(Exception):
+    """La cola del ejecutor de hashing está llena."""
+
+
+class PasswordHasher:
+    """
+    Ejecuta bcrypt en un pool propio (hilos o procesos) con una cola acotada.
+    Si la cola está llena se rechaza de inmediato en vez de acaparar el
+    threadpool compartido de Starlette.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 2, queue_size: int = 32):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"HASH_EXECUTOR inválido: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._hash_time_total = 0.0     # tiempo de CPU de bcrypt dentro del worker
+        self._latency_total = 0.0       # desde el envío hasta el resultado (incluye cola)
+        self._latency_max = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def submit(self, fn, *args, block: bool = False):
+        """Encola fn(*args); devuelve un Future cuyo resultado es (valor, segundos_de_hash)."""
+        if not self._slots.acquire(blocking=block):
+            with self._lock:
+                self._rejected += 1
+            raise HasherSaturatedError("Demasiadas operaciones de contraseña en curso.")
+        submitted = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._get_executor().submit(_timed, fn, *args)
+        except BaseException:
+            self._finish(submitted, None)
+            raise
+        future.add_done_callback(lambda f: self._finish(submitted, f))
+        return future
+
+    def _finish(self, submitted: float, future):
+        latency = time.perf_counter() - submitted
+        hash_time = 0.0
+        if future is not None and not future.cancelled() and future.exception() is None:
+            hash_time = future.result()[1]
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            self._hash_time_total += hash_time
+            self._latency_total += latency
+            if latency > self._latency_max:
+                self._latency_max = latency
+        self._slots.release()
+
+    # Los endpoints async esperan el Future en el event loop sin ocupar un hilo
+    async def hash_async(self, password: str) -> str:
+        return (await asyncio.wrap_future(self.submit(_hash, password)))[0]
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return (await asyncio.wrap_future(self.submit(_verify, plain_password, hashed_password)))[0]
+
+    def warm_up(self):
+        """Levanta todos los workers con un hash cada uno, para que no lo pague el primer login."""
+        futures = [self.submit(_warm_up, block=True) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def hash_many(self, passwords) -> list[str]:
+        """
+        Hashea en paralelo para cargas masivas. Mantiene como mucho `workers`
+        trabajos en vuelo para no agotar la cola que usan login y registro.
+        """
+        hashes = []
+        window = deque()
+        for password in passwords:
+            if len(window) >= self.workers:
+                hashes.append(window.popleft().result()[0])
+            window.append(self.submit(_hash, password, block=True))
+        while window:
+            hashes.append(window.popleft().result()[0])
+        return hashes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": min(self._pending, self.workers),
+                "queue_depth": max(0, self._pending - self.workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "hash_time_total": self._hash_time_total,
+                "latency_total": self._latency_total,
+                "latency_max": self._latency_max,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+
+hasher = PasswordHasher(HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_SIZE)
@@ -0,0 +1,176 @@
+# app/keys.py
+"""
+Llaves asimétricas para firmar los JWT (RS256 / ES256) y publicarlas como JWKS.
+
+Cada llave vive en JWT_KEYS_DIR como `<kid>.pem` (privada, puede firmar) o
+`<kid>.pub.pem` (solo pública, se sigue publicando para verificar tokens ya
+emitidos). Con una sola llave privada JWT_ACTIVE_KID es opcional; con más de
+una es obligatoria, para que publicar una llave nueva no la active. Rotación:
+  1. fijar JWT_ACTIVE_KID a la llave actual (si aún no lo estaba),
+  2. generar la nueva llave (`python -m app.keys generate <dir>`) y reiniciar
+     para publicarla en el JWKS (se sigue firmando con la actual),
+  3. esperar a que expire el caché del JWKS en los consumidores (JWKS_MAX_AGE),
+  4. apuntar JWT_ACTIVE_KID a la nueva llave,
+  5. retirar la antigua (o dejar solo su .pub.pem) cuando hayan expirado
+     los tokens que firmó (ACCESS_TOKEN_EXPIRE_MINUTES).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from jose import JWTError, jwk, jwt
+
+SUPPORTED_ALGORITHMS = ("RS256", "ES256")
+
+
+class SigningKey:
+    __slots__ = ("kid", "algorithm", "private", "public", "jwk")
+
+    def __init__(self, kid: str, algorithm: str, private=None, public=None):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private = private
+        self.public = public if public is not None else private.public_key()
+        self.jwk = {**self.public.to_dict(), "kid": kid, "use": "sig", "alg": algorithm}
+
+
+class KeyRing:
+    """Conjunto de llaves: una activa para firmar y todas las demás solo para verificar."""
+
+    def __init__(self, algorithm: str, keys: list, active_kid: str):
+        if algorithm not in SUPPORTED_ALGORITHMS:
+            raise RuntimeError(f"JWT_ALGORITHM no soportado: {algorithm}")
+        self.algorithm = algorithm
+        self._keys = {key.kid: key for key in keys}
+        active = self._keys.get(active_kid)
+        if active is None or active.private is None:
+            raise RuntimeError(f"No existe una llave privada para JWT_ACTIVE_KID={active_kid!r}.")
+        self.active = active
+        # El JWKS no cambia mientras viva el proceso: lo serializamos una sola vez
+        self.jwks_json = json.dumps({"keys": [key.jwk for key in self._keys.values()]}, separators=(",", ":"))
+        self.jwks_etag = '"' + hashlib.sha256(self.jwks_json.encode()).hexdigest()[:32] + '"'
+
+    @classmethod
+    def from_directory(cls, path: str, algorithm: str, active_kid: str = None) -> "KeyRing":
+        keys = []
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".pem"):
+                continue
+            with open(os.path.join(path, name)) as f:
+                pem = f.read()
+            if name.endswith(".pub.pem"):
+                keys.append(SigningKey(name[:-len(".pub.pem")], algorithm, public=jwk.construct(pem, algorithm)))
+            else:
+                keys.append(SigningKey(name[:-len(".pem")], algorithm, private=jwk.construct(pem, algorithm)))
+        if not keys:
+            raise RuntimeError(f"No se encontraron llaves en JWT_KEYS_DIR={path!r}.")
+        if active_kid is None:
+            # Sin JWT_ACTIVE_KID solo se adivina si no hay ambigüedad: tomar la más nueva
+            # empezaría a firmar con una llave que los consumidores quizá aún no tienen en caché
+            private_kids = [key.kid for key in keys if key.private is not None]
+            if len(private_kids) > 1:
+                raise RuntimeError(
+                    f"Hay {len(private_kids)} llaves privadas en JWT_KEYS_DIR: JWT_ACTIVE_KID es obligatoria "
+                    f"({', '.join(private_kids)})."
+                )
+            active_kid = private_kids[0] if private_kids else None
+        return cls(algorithm, keys, active_kid)
+
+    def sign(self, claims: dict) -> str:
+        return jwt.encode(claims, self.active.private, algorithm=self.algorithm, headers={"kid": self.active.kid})
+
+    def decode(self, token: str) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._keys.get(kid)
+        if key is None:
+            raise JWTError("kid desconocido")
+        return jwt.decode(token, key.public, algorithms=[self.algorithm])
+
+
+class JWKSVerifier:
+    """
+    Verificación local de tokens para servicios consumidores: descarga el JWKS,
+    guarda las llaves públicas ya parseadas por kid y solo vuelve a pedirlo
+    cuando caduca o aparece un kid desconocido (como mucho una vez cada
+    `min_refresh` segundos).
+    """
+
+    def __init__(self, jwks_url: str, algorithms=SUPPORTED_ALGORITHMS, max_age: float = 300, min_refresh: float = 30):
+        self.jwks_url = jwks_url
+        self.algorithms = list(algorithms)
+        self.max_age = max_age
+        self.min_refresh = min_refresh
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        import requests  # Solo lo necesitan los consumidores, no el servicio
+
+        response = requests.get(self.jwks_url, timeout=5)
+        response.raise_for_status()
+        keys = {}
+        for data in response.json().get("keys", []):
+            if data.get("alg") in self.algorithms and "kid" in data:
+                keys[data["kid"]] = jwk.construct(data, data["alg"])
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def _get_key(self, kid: str):
+        age = time.monotonic() - self._fetched_at
+        key = self._keys.get(kid)
+        if key is not None and age < self.max_age:
+            return key
+        with self._lock:
+            age = time.monotonic() - self._fetched_at
+            if age >= self.max_age or (kid not in self._keys and age >= self.min_refresh):
+                self._refresh()
+            return self._keys.get(kid)
+
+    def decode(self, token: str, **options) -> dict:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") not in self.algorithms:
+            raise JWTError("Algoritmo no permitido")
+        key = self._get_key(header.get("kid"))
+        if key is None:
+            raise JWTError("kid desconocido")
+        return jwt.decode(token, key, algorithms=[header["alg"]], **options)
+
+
+def generate_private_key_pem(algorithm: str) -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise RuntimeError(f"JWT_ALGORITHM no soportado: {algorithm}")
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime, timezone
+
+    parser = argparse.ArgumentParser(description="Gestión de llaves JWT")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="Genera una nueva llave privada en el directorio indicado")
+    gen.add_argument("directory")
+    gen.add_argument("--algorithm", default=os.environ.get("JWT_ALGORITHM", "RS256"))
+    gen.add_argument("--kid", default=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"))
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    target = os.path.join(args.directory, f"{args.kid}.pem")
+    fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(generate_private_key_pem(args.algorithm))
+    print(target)
@@ -0,0 +1,150 @@
+# app/lifecycle.py
+"""
+Arranque y parada del servicio (lifespan de FastAPI) y estado de los probes
+/health/live y /health/ready.
+
+Al arrancar se calienta, en paralelo, lo que de otro modo pagaría el primer
+request de cada instancia nueva:
+    - db:     abre DB_POOL_MIN_SIZE conexiones y hace un SELECT 1 (driver ODBC)
+    - bcrypt: un hash en cada worker del ejecutor (backend de passlib)
+    - jwt:    firma y verifica un token descartable (jose/cryptography, llaves)
+y se lanza la carga del filtro de disponibilidad, que no bloquea. Con
+TOKEN_MODE=stateless además se purgan los refresh tokens vencidos cada
+REFRESH_PURGE_INTERVAL segundos (con varias instancias la purga se repite,
+pero es idempotente).
+
+WARMUP_MODE:
+    "background" (defecto) -> el puerto abre de inmediato y /health/ready
+                              responde 503 hasta terminar; lo que falle
+                              (p.ej. la BBDD aún no responde) se reintenta.
+    "blocking"             -> uvicorn no acepta conexiones hasta terminar o
+                              hasta WARMUP_TIMEOUT, para routers sin readiness probe.
+    "off"                  -> lista de inmediato, sin calentar.
+
+Los tiempos de importación de app.main y de arranque quedan en el log, en
+/health/ready y en /metrics (auth_startup_*).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.auth_utils import (REFRESH_PURGE_INTERVAL, STATELESS_TOKENS, purge_expired_refresh_tokens,
+                            warm_up_tokens)
+from app.database import close_pool, run_db, warm_up_pool
+from app.hashing import hasher
+from app.membership import registration_filter
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "background")
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "30"))
+WARMUP_RETRY_SECONDS = float(os.environ.get("WARMUP_RETRY_SECONDS", "2"))
+if WARMUP_MODE not in ("background", "blocking", "off"):
+    raise RuntimeError(f"WARMUP_MODE inválido: {WARMUP_MODE}")
+
+WARMUPS = (("db", warm_up_pool), ("bcrypt", hasher.warm_up), ("jwt", warm_up_tokens))
+
+
+class Startup:
+    def __init__(self):
+        self.import_seconds = None
+        self.warmup_seconds = None   # desde el inicio del lifespan hasta quedar lista
+        self.checks = {}             # nombre -> segundos, o el último error
+        self.ready = False
+        self._started = None
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "checks": dict(self.checks),
+        }
+
+    def stats(self) -> dict:
+        values = {
+            "ready": self.ready,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+        }
+        for name, value in self.checks.items():
+            values[f"{name}_seconds"] = value
+        return values
+
+
+startup = Startup()
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+async def warm_up():
+    """Corre los calentamientos en paralelo y reintenta los que fallen hasta que todos pasen."""
+    pending = dict(WARMUPS)
+    while pending:
+        results = await asyncio.gather(*(run_in_threadpool(_timed, fn) for fn in pending.values()),
+                                       return_exceptions=True)
+        for name, result in zip(list(pending), results):
+            if isinstance(result, Exception):
+                startup.checks[name] = f"error: {result}"
+                logger.warning("Calentamiento '%s' falló, se reintenta en %ss: %s", name, WARMUP_RETRY_SECONDS, result)
+            else:
+                startup.checks[name] = round(result, 4)
+                del pending[name]
+        if pending:
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    startup.warmup_seconds = round(time.perf_counter() - startup._started, 4)
+    startup.ready = True
+    logger.info("Instancia lista: importación %.3fs, calentamiento %.3fs (%s)",
+                startup.import_seconds or 0, startup.warmup_seconds, startup.checks)
+
+
+async def purge_refresh_tokens():
+    while True:
+        try:
+            deleted = await run_db(purge_expired_refresh_tokens)
+            if deleted:
+                logger.info("Refresh tokens vencidos borrados: %s", deleted)
+        except Exception as ex:
+            logger.warning("No se pudieron purgar los refresh tokens vencidos: %s", ex)
+        await asyncio.sleep(REFRESH_PURGE_INTERVAL)
+
+
+def _shutdown():
+    registration_filter.stop()
+    close_pool()
+    hasher.shutdown()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    startup._started = time.perf_counter()
+    # En segundo plano: con millones de usuarios no queremos retrasar el arranque
+    registration_filter.start()
+    purge = asyncio.create_task(purge_refresh_tokens()) if STATELESS_TOKENS else None
+    task = None
+    if WARMUP_MODE == "off":
+        startup.warmup_seconds = 0.0
+        startup.ready = True
+    else:
+        task = asyncio.create_task(warm_up())
+        if WARMUP_MODE == "blocking":
+            await asyncio.wait({task}, timeout=WARMUP_TIMEOUT)
+            if not task.done():
+                logger.warning("El calentamiento superó WARMUP_TIMEOUT=%ss, sigue en segundo plano", WARMUP_TIMEOUT)
+    try:
+        yield
+    finally:
+        # uvicorn ya dejó de aceptar conexiones y drenó las abiertas antes de llegar aquí
+        for background in (task, purge):
+            if background is not None:
+                background.cancel()
+        await run_in_threadpool(_shutdown)
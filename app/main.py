@@ -1,175 +1,341 @@
 # auth-service/app/main.py
-from fastapi import FastAPI, HTTPException, status, Depends, Response # Importar Response
+import time
+_import_started = time.perf_counter()  # Tiempo de importación informado en /health/ready y /metrics
+
+from fastapi import FastAPI, HTTPException, status, Depends, Header, Request, Response # Importar Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from typing import Annotated
+from fastapi.concurrency import run_in_threadpool
+from typing import Annotated, Optional
+from datetime import datetime, timezone
+import os
+import secrets
 import pyodbc
 from dotenv import load_dotenv
 
 load_dotenv(override=True) # Cargar .env primero y forzar sobrescritura
 
 # Asegúrate que UserPublic esté importado y completo
-from app.models import UserCreate, TokenResponse, UserPublic, UserInDB
-from app.database import get_db_connection
+from app.models import (UserCreate, TokenResponse, UserPublic, UserInDB, TokenClaims, RefreshRequest, RefreshResponse,
+                        IntrospectRequest, IntrospectResponse, BulkImportResult, AvailabilityResponse,
+                        ROLE_ADMIN, ROLE_CLIENTE, ROLE_PROVEEDOR, ROLE_HYBRID, STATUS_ACTIVO, rol_nombre)
+from app.cache import user_cache
+from app.database import run_db, db_executor_stats
 from app.auth_utils import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
     create_access_token,
-    get_current_active_user # Importamos la versión completa
+    create_refresh_token,
+    hash_refresh_token,
+    new_refresh_family,
+    refresh_token_expiration,
+    STATELESS_TOKENS,
+    get_jwks,
+    JWKS_MAX_AGE,
+    introspect_tokens,
+    get_current_active_user, # Importamos la versión completa
+    get_current_token_claims
 )
 from app.utils import validar_rut
+from app.mappers import user_public_dict
+from app.membership import registration_filter, check_availability
+from app.metrics import MetricsMiddleware, METRICS_ENABLED, phase, registry
+from app.database import get_pool
+from app.hashing import hasher
+from app import queries
+from app.throttle import login_throttle, check_login_throttle
+from app.lifecycle import lifespan, startup
+
+# orjson serializa las respuestas; las del camino caliente se devuelven ya armadas (ver app/mappers.py)
+app = FastAPI(title="Servicio de Autenticación - Chambee", version="1.0.0", default_response_class=ORJSONResponse,
+              lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
-app = FastAPI(title="Servicio de Autenticación - Chambee", version="1.0.0")
+registry.register_gauges("db_pool", lambda: get_pool().stats())
+registry.register_gauges("db_executor", db_executor_stats)
+registry.register_gauges("hasher", hasher.stats)
+registry.register_gauges("user_cache", user_cache.stats)
+registry.register_gauges("availability_filter", registration_filter.stats)
+registry.register_gauges("login_throttle", login_throttle.stats)
+registry.register_gauges("startup", startup.stats)
 
-ROLE_ADMIN, ROLE_CLIENTE, ROLE_PROVEEDOR, ROLE_HYBRID = 0, 1, 2, 3
-STATUS_ACTIVO = 'activo'
+INTROSPECTION_API_KEY = os.environ.get("INTROSPECTION_API_KEY") # Si está definida, /auth/introspect la exige
 
 @app.get("/", tags=["Status"])
-def root(): return {"message": "Auth Service funcionando 🚀"}
+async def root(): return {"message": "Auth Service funcionando 🚀"}
 
-@app.post("/auth/register", status_code=status.HTTP_201_CREATED, response_model=UserPublic, tags=["Autenticación y Usuarios"])
-def register_client(user_data: UserCreate, conn: pyodbc.Connection = Depends(get_db_connection)):
-    if not validar_rut(user_data.rut):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="RUT inválido.")
+@app.get("/health/live", tags=["Status"])
+async def health_live():
+    """El proceso responde. No revisa dependencias: una caída de la BBDD no debe reiniciar instancias."""
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["Status"])
+async def health_ready():
+    """503 mientras la instancia se calienta, para que el router no le mande tráfico todavía."""
+    report = startup.report()
+    return ORJSONResponse(report, status_code=status.HTTP_200_OK if report["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Histogramas por ruta y fase, y estado de pool/bcrypt/caché en formato Prometheus."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Métricas deshabilitadas.")
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/.well-known/jwks.json", tags=["Status"])
+async def jwks(request: Request):
+    """Llaves públicas para que otros servicios verifiquen los tokens localmente."""
+    body, etag = get_jwks()
+    headers = {"Cache-Control": f"public, max-age={JWKS_MAX_AGE}", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
+
+# --- ACCESO A BBDD DE LOS ENDPOINTS ---
+# Reciben la conexión y se ejecutan con run_db(): solo el trabajo de BBDD ocupa
+# un hilo, y nunca se retiene una conexión mientras se espera a bcrypt.
+
+def _check_conflicts_or_upgrade(conn: pyodbc.Connection, user_data: UserCreate) -> Optional[UserPublic]:
+    """
+    Revisa duplicados de RUT/correo. Si el RUT es de un prestador lo pasa a
+    híbrido y devuelve su UserPublic; si no hay conflicto devuelve None.
+    """
     cursor = conn.cursor()
-    cursor.execute("SELECT id_usuario, id_rol, rut, correo, foto_url FROM Usuarios WHERE rut = ? OR correo = ?", user_data.rut, user_data.correo)
-    existing_user = cursor.fetchone()
-
-    if existing_user:
-        if existing_user.rut == user_data.rut and existing_user.id_rol == ROLE_PROVEEDOR:
-            if existing_user.correo != user_data.correo:
-                cursor.execute("SELECT id_usuario FROM Usuarios WHERE correo = ?", user_data.correo)
-                if cursor.fetchone():
-                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El nuevo correo electrónico ya está en uso.")
-            try:
-                # Actualizamos rol y datos, y también token_valido_desde
-                cursor.execute(
-                    """
-                    UPDATE Usuarios SET id_rol = ?, nombres = ?, primer_apellido = ?, segundo_apellido = ?, correo = ?,
-                           direccion = ?, genero = ?, fecha_nacimiento = ?, token_valido_desde = GETUTCDATE()
-                    WHERE id_usuario = ?
-                    """, ROLE_HYBRID, user_data.nombres, user_data.primer_apellido, user_data.segundo_apellido,
-                    user_data.correo, user_data.direccion, user_data.genero, user_data.fecha_nacimiento, existing_user.id_usuario)
-                conn.commit()
-                # Consultamos la foto actualizada por si acaso (aunque no debería cambiar aquí)
-                cursor.execute("SELECT foto_url FROM Usuarios WHERE id_usuario = ?", existing_user.id_usuario)
-                updated_user_record = cursor.fetchone()
-                foto_url_final = updated_user_record.foto_url if updated_user_record else existing_user.foto_url
-
-            except pyodbc.Error as e:
-                conn.rollback(); raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al actualizar rol: {e}")
-            finally:
-                cursor.close()
-            # Devolvemos UserPublic completo
-            return UserPublic(id=str(existing_user.id_usuario), nombres=user_data.nombres, primer_apellido=user_data.primer_apellido,
-                              segundo_apellido=user_data.segundo_apellido, rut=user_data.rut, correo=user_data.correo,
-                              direccion=user_data.direccion, rol="híbrido", foto_url=foto_url_final,
-                              genero=user_data.genero, fecha_nacimiento=user_data.fecha_nacimiento)
-        else:
-            cursor.close(); raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El RUT o correo ya está registrado.")
-    else:
-        hashed_password = get_password_hash(user_data.password)
+    try:
+        conflicts = {row.coincide: row for row in queries.execute(
+            cursor, queries.SELECT_REGISTER_CONFLICTS, user_data.rut, user_data.correo, user_data.rut
+        ).fetchall()}
+        if not conflicts:
+            return None
+        existing_user = conflicts.get("rut")
+        if not existing_user or existing_user.id_rol != ROLE_PROVEEDOR:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El RUT o correo ya está registrado.")
+        if "correo" in conflicts:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El nuevo correo electrónico ya está en uso.")
         try:
-            # Insertamos con GETUTCDATE() para token_valido_desde
-            cursor.execute(
-                """
-                INSERT INTO Usuarios (rut, nombres, primer_apellido, segundo_apellido, correo, contrasena, direccion, id_rol, estado, genero, fecha_nacimiento, token_valido_desde)
-                OUTPUT INSERTED.id_usuario, INSERTED.foto_url, INSERTED.rut, INSERTED.segundo_apellido, INSERTED.direccion
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETUTCDATE())
-                """,
-                user_data.rut, user_data.nombres, user_data.primer_apellido, user_data.segundo_apellido,
-                user_data.correo, hashed_password, user_data.direccion, ROLE_CLIENTE, STATUS_ACTIVO,
-                user_data.genero, user_data.fecha_nacimiento
+            # Actualizamos rol y datos, y también token_valido_desde; OUTPUT devuelve la foto actual
+            updated_user_record = queries.execute(
+                cursor, queries.UPGRADE_TO_HYBRID,
+                ROLE_HYBRID, user_data.nombres, user_data.primer_apellido, user_data.segundo_apellido,
+                user_data.correo, user_data.direccion, user_data.genero, user_data.fecha_nacimiento, existing_user.id_usuario
+            ).fetchone()
+            queries.commit(conn)
+        except pyodbc.Error as e:
+            conn.rollback(); raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al actualizar rol: {e}")
+    finally:
+        cursor.close()
+
+    user_cache.invalidate(existing_user.id_usuario)
+    registration_filter.add(correo=user_data.correo)
+    foto_url_final = updated_user_record.foto_url if updated_user_record else existing_user.foto_url
+    # Devolvemos UserPublic completo
+    return UserPublic(id=str(existing_user.id_usuario), nombres=user_data.nombres, primer_apellido=user_data.primer_apellido,
+                      segundo_apellido=user_data.segundo_apellido, rut=user_data.rut, correo=user_data.correo,
+                      direccion=user_data.direccion, rol=rol_nombre(ROLE_HYBRID), foto_url=foto_url_final,
+                      genero=user_data.genero, fecha_nacimiento=user_data.fecha_nacimiento)
+
+def _insert_client(conn: pyodbc.Connection, user_data: UserCreate, hashed_password: str) -> UserPublic:
+    cursor = conn.cursor()
+    try:
+        # Usuario y perfil vacío en un solo lote, con GETUTCDATE() para token_valido_desde
+        result = queries.execute(
+            cursor, queries.INSERT_USER_WITH_PROFILE,
+            user_data.rut, user_data.nombres, user_data.primer_apellido, user_data.segundo_apellido,
+            user_data.correo, hashed_password, user_data.direccion, ROLE_CLIENTE, STATUS_ACTIVO,
+            user_data.genero, user_data.fecha_nacimiento
+        ).fetchone()
+        new_user_id, new_user_foto_url, inserted_rut, inserted_segundo_apellido, inserted_direccion = result[0], result[1], result[2], result[3], result[4]
+        queries.drain(cursor)  # corre el SET NOCOUNT OFF del lote
+        queries.commit(conn)
+    except pyodbc.Error as e:
+        conn.rollback(); raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error en BBDD: {e}")
+    finally:
+        cursor.close()
+    registration_filter.add(user_data.rut, user_data.correo)
+
+    # Devolvemos UserPublic completo
+    return UserPublic(id=str(new_user_id), nombres=user_data.nombres, primer_apellido=user_data.primer_apellido,
+                      segundo_apellido=inserted_segundo_apellido, rut=inserted_rut, correo=user_data.correo,
+                      direccion=inserted_direccion, rol=rol_nombre(ROLE_CLIENTE), foto_url=new_user_foto_url,
+                      genero=user_data.genero, fecha_nacimiento=user_data.fecha_nacimiento)
+
+def _select_login_user(conn: pyodbc.Connection, correo: str):
+    cursor = conn.cursor()
+    # Traemos todos los campos necesarios para UserPublic
+    user_record = queries.execute(cursor, queries.SELECT_LOGIN, correo).fetchone()
+    cursor.close()
+    return user_record
+
+def _start_session(conn: pyodbc.Connection, id_usuario: int) -> Optional[str]:
+    """Invalida las sesiones anteriores; en modo stateless devuelve además un refresh token nuevo."""
+    refresh_token = None
+    cursor = conn.cursor()
+    try:
+        if STATELESS_TOKENS:
+            # Un login nuevo revoca todas las cadenas de refresh anteriores (cierra otras sesiones)
+            refresh_token, refresh_hash = create_refresh_token()
+            queries.execute(
+                cursor, queries.TOUCH_SESSION_WITH_REFRESH,
+                id_usuario, id_usuario, refresh_hash, id_usuario, new_refresh_family(), refresh_token_expiration()
             )
-            result = cursor.fetchone()
-            new_user_id, new_user_foto_url, inserted_rut, inserted_segundo_apellido, inserted_direccion = result[0], result[1], result[2], result[3], result[4]
+            queries.drain(cursor)
+        else:
+            queries.execute(cursor, queries.TOUCH_SESSION, id_usuario)
+        queries.commit(conn)
+    except pyodbc.Error as e:
+        conn.rollback(); raise HTTPException(status_code=500, detail=f"No se pudo actualizar la sesión: {e}")
+    finally:
+        cursor.close()
+    return refresh_token
 
-            # Creamos perfil vacío solo si es necesario (ajustar si la lógica cambió)
-            cursor.execute("INSERT INTO Perfil (id_usuario) VALUES (?)", new_user_id)
-            conn.commit()
-        except pyodbc.Error as e:
-            conn.rollback(); raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error en BBDD: {e}")
-        finally:
-            cursor.close()
+def _refresh_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido o expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
-        # Devolvemos UserPublic completo
-        return UserPublic(id=str(new_user_id), nombres=user_data.nombres, primer_apellido=user_data.primer_apellido,
-                          segundo_apellido=inserted_segundo_apellido, rut=inserted_rut, correo=user_data.correo,
-                          direccion=inserted_direccion, rol="cliente", foto_url=new_user_foto_url,
-                          genero=user_data.genero, fecha_nacimiento=user_data.fecha_nacimiento)
+def _rotate_refresh_token(conn: pyodbc.Connection, refresh_token: str):
+    """Canjea el refresh token; devuelve (id_usuario, id_rol, refresh token nuevo)."""
+    cursor = conn.cursor()
+    try:
+        # Marcamos el token como usado y leemos el estado previo en una sola sentencia atómica
+        record = queries.execute(cursor, queries.CLAIM_REFRESH_TOKEN, hash_refresh_token(refresh_token)).fetchone()
+        if record is None:
+            conn.rollback(); raise _refresh_exception()
+        if record.usado:
+            # Reutilización detectada: invalidamos toda la familia
+            queries.execute(cursor, queries.REVOKE_REFRESH_FAMILY, record.familia)
+            queries.commit(conn); raise _refresh_exception()
+        if record.expira <= datetime.now(timezone.utc).replace(tzinfo=None):
+            queries.execute(cursor, queries.REVOKE_REFRESH_FAMILY, record.familia)
+            queries.commit(conn); raise _refresh_exception()
+        if record.estado != STATUS_ACTIVO:
+            conn.rollback(); raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="La cuenta no está activa.")
+
+        new_refresh_token, new_refresh_hash = create_refresh_token()
+        # El sucesor hereda el vencimiento de la familia: rotar no extiende la sesión
+        queries.execute(
+            cursor, queries.INSERT_REFRESH_TOKEN,
+            new_refresh_hash, record.id_usuario, record.familia, record.expira
+        )
+        queries.commit(conn)
+    except pyodbc.Error as e:
+        conn.rollback(); raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error en BBDD: {e}")
+    finally:
+        cursor.close()
+    return record.id_usuario, record.id_rol, new_refresh_token
 
 
+# --- ENDPOINTS ---
+
+@app.post("/auth/register", status_code=status.HTTP_201_CREATED, response_model=UserPublic, tags=["Autenticación y Usuarios"])
+async def register_client(user_data: UserCreate):
+    if not validar_rut(user_data.rut):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="RUT inválido.")
+
+    hybrid_user = await run_db(_check_conflicts_or_upgrade, user_data)
+    if hybrid_user is not None:
+        return hybrid_user
+    hashed_password = await get_password_hash_async(user_data.password)
+    return await run_db(_insert_client, user_data, hashed_password)
+
+
+@app.get("/auth/availability", response_model=AvailabilityResponse, tags=["Autenticación y Usuarios"])
+async def registration_availability(rut: Optional[str] = None, correo: Optional[str] = None):
+    """Indica si un RUT y/o correo están libres para registrarse (pensado para validar mientras se escribe)."""
+    if rut is None and correo is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indique rut y/o correo.")
+    return AvailabilityResponse(**await check_availability(rut, correo))
+
 @app.post("/auth/login", response_model=TokenResponse, tags=["Autenticación y Usuarios"])
-def login_for_access_token(
+async def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-        conn: pyodbc.Connection = Depends(get_db_connection)
+        client_ip: Annotated[str, Depends(check_login_throttle)], # Rechaza antes de tocar la BBDD o bcrypt
 ):
     correo_usuario = form_data.username
     password_usuario = form_data.password
 
-    cursor = conn.cursor()
-    # Traemos todos los campos necesarios para UserPublic
-    cursor.execute(
-        """
-        SELECT id_usuario, nombres, primer_apellido, segundo_apellido, rut,
-               contrasena, direccion, id_rol, estado, foto_url, genero, fecha_nacimiento,
-               token_valido_desde
-        FROM Usuarios WHERE correo = ?
-        """,
-        correo_usuario
-    )
-    user_record = cursor.fetchone()
-
-    if not user_record or not verify_password(password_usuario, user_record.contrasena):
-        cursor.close(); raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales incorrectas")
+    user_record = await run_db(_select_login_user, correo_usuario)
+    if not user_record or not await verify_password_async(password_usuario, user_record.contrasena):
+        await login_throttle.record(client_ip, correo_usuario, success=False)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales incorrectas")
     if user_record.estado != STATUS_ACTIVO:
-        cursor.close(); raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="La cuenta no está activa.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="La cuenta no está activa.")
+    await login_throttle.record(client_ip, correo_usuario, success=True)
 
-    try:
-        # Usar GETUTCDATE() para consistencia
-        cursor.execute("UPDATE Usuarios SET token_valido_desde = GETUTCDATE() WHERE id_usuario = ?", user_record.id_usuario)
-        conn.commit()
-    except pyodbc.Error as e:
-        conn.rollback(); cursor.close(); raise HTTPException(status_code=500, detail=f"No se pudo actualizar la sesión: {e}")
-    cursor.close()
+    refresh_token = await run_db(_start_session, user_record.id_usuario)
+    # Las sesiones anteriores quedan invalidadas: el caché no puede seguir aceptándolas
+    user_cache.invalidate(user_record.id_usuario)
 
-    rol_map = {0: "administrador", 1: "cliente", 2: "prestador", 3: "híbrido"}
-    rol_str = rol_map.get(user_record.id_rol, "desconocido")
-    access_token = create_access_token(data={"sub": str(user_record.id_usuario), "rol": rol_str})
-
-    # Construimos el UserPublic completo
-    usuario_publico = UserPublic(
-        id=str(user_record.id_usuario),
-        nombres=user_record.nombres,
-        primer_apellido=user_record.primer_apellido,
-        segundo_apellido=user_record.segundo_apellido,
-        rut=user_record.rut,
-        correo=correo_usuario,
-        direccion=user_record.direccion,
-        rol=rol_str,
-        foto_url=user_record.foto_url,
-        genero=user_record.genero,
-        fecha_nacimiento=user_record.fecha_nacimiento
-    )
-    return TokenResponse(token=access_token, usuario=usuario_publico)
+    access_token = create_access_token(data={"sub": str(user_record.id_usuario), "rol": rol_nombre(user_record.id_rol)})
+
+    with phase("model"):
+        # UserPublic completo directo desde la fila, sin pasar por response_model
+        usuario_publico = user_public_dict(user_record, correo_usuario)
+        return ORJSONResponse({"token": access_token, "usuario": usuario_publico, "refresh_token": refresh_token})
+
+@app.post("/auth/refresh", response_model=RefreshResponse, tags=["Autenticación y Usuarios"])
+async def refresh_access_token(body: RefreshRequest):
+    """
+    Canjea un refresh token por un access token nuevo y rota el refresh token.
+    Reutilizar un refresh token ya canjeado revoca toda su cadena (posible robo).
+    """
+    if not STATELESS_TOKENS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Refresh tokens deshabilitados.")
+    id_usuario, id_rol, new_refresh_token = await run_db(_rotate_refresh_token, body.refresh_token)
+
+    access_token = create_access_token(data={"sub": str(id_usuario), "rol": rol_nombre(id_rol)})
+    return RefreshResponse(token=access_token, refresh_token=new_refresh_token)
+
+@app.post("/auth/introspect", response_model=IntrospectResponse, tags=["Autenticación y Usuarios"])
+async def introspect(body: IntrospectRequest, x_introspection_key: Annotated[Optional[str], Header()] = None):
+    """Valida muchos tokens en una llamada (gateway / servicio a servicio)."""
+    if INTROSPECTION_API_KEY and not secrets.compare_digest(x_introspection_key or "", INTROSPECTION_API_KEY):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Clave de introspección inválida.")
+    return IntrospectResponse(results=await introspect_tokens(body.tokens))
 
 @app.get("/users/me", response_model=UserPublic, tags=["Autenticación y Usuarios"])
-def read_users_me(current_user: UserInDB = Depends(get_current_active_user)):
+async def read_users_me(current_user: UserInDB = Depends(get_current_active_user)):
     """Devuelve los datos públicos COMPLETOS del usuario autenticado."""
-    rol_map = {0: "administrador", 1: "cliente", 2: "prestador", 3: "híbrido"}
-    rol_str = rol_map.get(current_user.id_rol, "desconocido")
-
     # Mapeamos TODOS los campos desde UserInDB a UserPublic
-    return UserPublic(
-        id=str(current_user.id_usuario),
-        nombres=current_user.nombres,
-        primer_apellido=current_user.primer_apellido,
-        segundo_apellido=current_user.segundo_apellido,
-        rut=current_user.rut,
-        correo=current_user.correo,
-        direccion=current_user.direccion,
-        rol=rol_str,
-        foto_url=current_user.foto_url,
-        genero=current_user.genero,
-        fecha_nacimiento=current_user.fecha_nacimiento
-    )
\ No newline at end of file
+    with phase("model"):
+        return ORJSONResponse(user_public_dict(current_user))
+
+@app.post("/admin/users/import", response_model=BulkImportResult, tags=["Administración"])
+async def bulk_import_users(request: Request, claims: TokenClaims = Depends(get_current_token_claims)):
+    """
+    Importa clientes en masa. El cuerpo se lee en streaming: NDJSON por defecto
+    o CSV con cabecera si el Content-Type es text/csv.
+    """
+    if claims.rol != rol_nombre(ROLE_ADMIN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo un administrador puede importar usuarios.")
+
+    # Solo lo usa este endpoint de administración
+    from app.bulk_import import BulkImporter, BULK_IMPORT_MAX_LINE_BYTES
+
+    importer = BulkImporter("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    buffer = b""
+    skipping = False  # descartando el resto de una línea demasiado larga
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if skipping:
+            if not lines:
+                buffer = b""
+                continue
+            lines.pop(0)
+            skipping = False
+        for line in lines:
+            if importer.feed(line):
+                await run_in_threadpool(importer.flush)
+        if len(buffer) > BULK_IMPORT_MAX_LINE_BYTES:
+            importer.feed(buffer)  # queda informada como demasiado larga
+            buffer, skipping = b"", True
+    if buffer:
+        importer.feed(buffer)
+    await run_in_threadpool(importer.flush)
+    return importer.summary()
+
+startup.import_seconds = round(time.perf_counter() - _import_started, 4)
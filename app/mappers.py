@@ -0,0 +1,55 @@
+# app/mappers.py
+"""
+Filas de pyodbc -> modelos y respuestas sin volver a validar lo que SQL
+Server ya entrega tipado.
+
+row_mapper() compila una vez por forma de resultado (cursor_description) la
+correspondencia columna -> campo del modelo, alias incluidos, y construye con
+model_construct. Las respuestas del camino caliente (/users/me, login) se
+arman como dicts que ORJSONResponse serializa directo, sin la doble pasada
+de response_model (que se mantiene en los endpoints para el esquema OpenAPI).
+"""
+
+import threading
+
+from app.models import rol_nombre
+
+_mappers = {}   # (modelo, cursor_description) -> función fila -> instancia
+_lock = threading.Lock()
+
+
+def row_mapper(model, description):
+    key = (model, description)
+    mapper = _mappers.get(key)
+    if mapper is None:
+        by_alias = {field.alias or name: name for name, field in model.model_fields.items()}
+        names = tuple(by_alias.get(column[0], column[0]) for column in description)
+        construct = model.model_construct
+
+        def mapper(row):
+            return construct(**dict(zip(names, row)))
+
+        with _lock:
+            mapper = _mappers.setdefault(key, mapper)
+    return mapper
+
+
+def map_row(model, row):
+    return row_mapper(model, row.cursor_description)(row)
+
+
+def user_public_dict(user, correo: str = None) -> dict:
+    """Campos de UserPublic desde un UserInDB o una fila con las mismas columnas."""
+    return {
+        "id": str(user.id_usuario),
+        "nombres": user.nombres,
+        "primer_apellido": user.primer_apellido,
+        "segundo_apellido": user.segundo_apellido,
+        "rut": user.rut,
+        "correo": correo if correo is not None else user.correo,
+        "direccion": user.direccion,
+        "rol": rol_nombre(user.id_rol),
+        "foto_url": user.foto_url,
+        "genero": user.genero,
+        "fecha_nacimiento": user.fecha_nacimiento,
+    }
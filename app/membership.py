@@ -0,0 +1,246 @@
+# app/membership.py
+"""
+Filtro de pertenencia en memoria para consultas de disponibilidad de RUT/correo.
+
+Un filtro de Bloom nunca da falsos negativos: si dice que un valor no está,
+no está en Usuarios (al momento de la última carga) y se responde sin tocar
+SQL Server. Si dice que puede estar, se confirma con un seek indexado.
+
+Es orientativo: cada worker tiene su propia copia, que se recarga cada
+AVAILABILITY_RELOAD_SECONDS. El registro sigue validando duplicados en BBDD.
+
+Estimación de memoria:
+    python -m app.membership 5000000
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from app import queries
+from app.database import db_connection, run_db
+from app.models import ROLE_PROVEEDOR
+from app.utils import normalizar_rut
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_ERROR_RATE = float(os.environ.get("AVAILABILITY_ERROR_RATE", "0.01"))
+AVAILABILITY_RELOAD_SECONDS = float(os.environ.get("AVAILABILITY_RELOAD_SECONDS", "600"))
+AVAILABILITY_MIN_CAPACITY = 100_000
+LOAD_BATCH_SIZE = 10_000
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = self.bits_for(self.capacity, error_rate)
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    @staticmethod
+    def bits_for(capacity: int, error_rate: float) -> int:
+        return max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+
+    def _positions(self, item: str):
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de un solo digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, item: str):
+        bits = self._bits
+        for pos in self._positions(item):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+
+def normalizar_correo(correo: str) -> str:
+    # SQL Server compara correos sin distinguir mayúsculas (collation CI)
+    return correo.strip().lower()
+
+
+class RegistrationFilter:
+    """Par de filtros (RUT y correo) que se reconstruye periódicamente desde Usuarios."""
+
+    def __init__(self, error_rate: float = AVAILABILITY_ERROR_RATE):
+        self.error_rate = error_rate
+        self._ruts = None
+        self._correos = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._adds_during_load = None   # altas ocurridas mientras se reconstruye el filtro
+        self.loaded_at = None
+        self.load_seconds = None
+        self.negatives = 0      # respuestas sin tocar la BBDD
+        self.fallthroughs = 0   # posibles positivos confirmados con un seek
+
+    @property
+    def loaded(self) -> bool:
+        return self._ruts is not None
+
+    def load(self):
+        start = time.perf_counter()
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                total = queries.execute(cursor, queries.COUNT_USERS).fetchone()[0]
+                # Holgura para los registros que lleguen hasta la próxima recarga
+                capacity = max(AVAILABILITY_MIN_CAPACITY, int(total * 1.5))
+                ruts = BloomFilter(capacity, self.error_rate)
+                correos = BloomFilter(capacity, self.error_rate)
+                with self._lock:
+                    self._adds_during_load = []
+                queries.execute(cursor, queries.SELECT_ALL_RUT_CORREO)
+                while True:
+                    rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+                    if not rows:
+                        break
+                    for rut, correo in rows:
+                        if rut:
+                            ruts.add(normalizar_rut(rut))
+                        if correo:
+                            correos.add(normalizar_correo(correo))
+                cursor.close()
+        except BaseException:
+            with self._lock:
+                self._adds_during_load = None
+            raise
+        with self._lock:
+            # Reaplicamos las altas que pudieron quedar fuera de la lectura
+            for rut, correo in self._adds_during_load:
+                if rut:
+                    ruts.add(normalizar_rut(rut))
+                if correo:
+                    correos.add(normalizar_correo(correo))
+            self._adds_during_load = None
+            self._ruts, self._correos = ruts, correos
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start
+
+    def add(self, rut: str = None, correo: str = None):
+        with self._lock:
+            if self._adds_during_load is not None:
+                self._adds_during_load.append((rut, correo))
+            if self._ruts is None:
+                return  # La carga en curso lo incluirá
+            if rut:
+                self._ruts.add(normalizar_rut(rut))
+            if correo:
+                self._correos.add(normalizar_correo(correo))
+
+    def might_have_rut(self, rut: str) -> bool:
+        ruts = self._ruts
+        return ruts is None or normalizar_rut(rut) in ruts
+
+    def might_have_correo(self, correo: str) -> bool:
+        correos = self._correos
+        return correos is None or normalizar_correo(correo) in correos
+
+    def start(self, interval: float = AVAILABILITY_RELOAD_SECONDS):
+        """Carga en segundo plano y recarga cada `interval` segundos, sin bloquear el arranque."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.load()
+                except Exception as ex:
+                    logger.warning("No se pudo cargar el filtro de disponibilidad: %s", ex)
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="availability-filter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        ruts, correos = self._ruts, self._correos
+        return {
+            "loaded": ruts is not None,
+            "entries": (ruts.count + correos.count) if ruts else 0,
+            "memory_bytes": (ruts.memory_bytes + correos.memory_bytes) if ruts else 0,
+            "error_rate": self.error_rate,
+            "load_seconds": self.load_seconds,
+            "negatives": self.negatives,
+            "fallthroughs": self.fallthroughs,
+        }
+
+
+registration_filter = RegistrationFilter()
+
+
+def _confirm_availability(conn, rut: str = None, correo: str = None, correo_rut: str = None) -> dict:
+    result = {}
+    cursor = conn.cursor()
+    if rut is not None:
+        row = queries.execute(cursor, queries.SELECT_ROL_BY_RUT, rut).fetchone()
+        # Un prestador puede registrarse como cliente (pasa a híbrido), así que su RUT sigue disponible
+        result["rut_disponible"] = row is None or row.id_rol == ROLE_PROVEEDOR
+    if correo is not None:
+        # Con el RUT del formulario, su propio correo no cuenta: register_client acepta el paso a híbrido
+        if correo_rut is None:
+            row = queries.execute(cursor, queries.CORREO_EXISTS, correo).fetchone()
+        else:
+            row = queries.execute(cursor, queries.CORREO_EXISTS_OTHER_RUT, correo, correo_rut).fetchone()
+        result["correo_disponible"] = row is None
+    cursor.close()
+    return result
+
+
+async def check_availability(rut: str = None, correo: str = None) -> dict:
+    """
+    Disponibilidad de RUT/correo para el formulario de registro. Los negativos
+    del filtro se responden en memoria; solo los posibles positivos hacen un
+    seek por columna (nunca un OR entre ambas).
+    """
+    result = {"rut_disponible": None, "correo_disponible": None}
+    check_rut = rut is not None and registration_filter.might_have_rut(rut)
+    check_correo = correo is not None and registration_filter.might_have_correo(correo)
+    if rut is not None and not check_rut:
+        result["rut_disponible"] = True
+        registration_filter.negatives += 1
+    if correo is not None and not check_correo:
+        result["correo_disponible"] = True
+        registration_filter.negatives += 1
+    if not (check_rut or check_correo):
+        return result
+
+    registration_filter.fallthroughs += check_rut + check_correo
+    result.update(await run_db(_confirm_availability, rut if check_rut else None,
+                               correo if check_correo else None, rut if check_correo else None))
+    return result
+
+
+def estimate_memory(entries: int, error_rate: float = AVAILABILITY_ERROR_RATE, avg_len: int = 20) -> dict:
+    """Memoria aproximada de un filtro de Bloom frente a un set de Python con las mismas cadenas."""
+    bloom = (BloomFilter.bits_for(entries, error_rate) + 7) // 8
+    # str ASCII en CPython: 49 bytes de cabecera + contenido; set: ~2 slots de 16 bytes por entrada
+    python_set = entries * (49 + avg_len) + 2 ** math.ceil(math.log2(max(8, entries * 5 / 3))) * 16
+    return {"entries": entries, "error_rate": error_rate, "bloom_bytes": bloom, "set_bytes": python_set}
+
+
+if __name__ == "__main__":
+    import sys
+
+    for n in [int(arg) for arg in sys.argv[1:]] or [1_000_000, 5_000_000, 10_000_000]:
+        estimate = estimate_memory(n)
+        print(f"{n:>12,} entradas  bloom={estimate['bloom_bytes'] / 2**20:8.1f} MiB  "
+              f"set={estimate['set_bytes'] / 2**20:8.1f} MiB  (por filtro, p={estimate['error_rate']})")
@@ -0,0 +1,212 @@
+# app/metrics.py
+"""
+Instrumentación del camino caliente: tiempos por fase dentro de cada request
+(conexión, consultas, bcrypt, JWT, modelos), histogramas por ruta servidos en
+/metrics en formato Prometheus y cabecera Server-Timing opcional.
+
+METRICS_ENABLED=0 lo desactiva por completo: phase() queda en un par de
+perf_counter() y un ContextVar.get() que no encuentra request, y el registro
+no toma su lock (los puntos calientes ni siquiera lo llaman).
+SERVER_TIMING: "off", "on-demand" (si el cliente envía X-Server-Timing: 1) o "always".
+"""
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "on-demand")
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fases acumuladas del request en curso: {nombre: [segundos, veces]}
+_phases: ContextVar = ContextVar("request_phases", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = 0
+        for bound in BUCKETS:
+            if value <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # (nombre, etiquetas) -> Histogram
+        self._counters = {}     # (nombre, etiquetas) -> float
+        self._gauges = []       # (prefijo, callable que devuelve un dict)
+
+    def observe(self, name: str, labels: tuple, value: float):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def register_gauges(self, prefix: str, collect):
+        """`collect()` devuelve un dict; cada valor numérico se publica como gauge `auth_<prefijo>_<clave>`."""
+        self._gauges.append((prefix, collect))
+
+    def snapshot(self) -> dict:
+        """Copia de histogramas (suma, cantidad) y contadores, para herramientas como el benchmark."""
+        with self._lock:
+            return {
+                "histograms": {key: (h.sum, h.count) for key, h in self._histograms.items()},
+                "counters": dict(self._counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            hist_copies = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        seen = set()
+        for (name, labels), counts, total, count in hist_copies:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            base = _format_labels(labels)
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{base} {total}")
+            lines.append(f"{name}_count{base} {count}")
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for prefix, collect in self._gauges:
+            try:
+                values = collect()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE auth_{prefix}_{key} gauge")
+                    lines.append(f"auth_{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+registry = Registry()
+
+
+# --- FASES DENTRO DE UN REQUEST ---
+
+def record_phase(name: str, seconds: float):
+    phases = _phases.get()
+    if phases is not None:
+        entry = phases.get(name)
+        if entry is None:
+            phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+class phase:
+    """Context manager que suma la duración del bloque a la fase `name` del request actual."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_phase(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# --- MIDDLEWARE ASGI ---
+
+class MetricsMiddleware:
+    """Middleware ASGI puro (sin BaseHTTPMiddleware) para no añadir tareas ni copias del cuerpo."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        phases = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        status_code = 500
+        want_timing = SERVER_TIMING == "always" or (
+            SERVER_TIMING == "on-demand" and (b"x-server-timing", b"1") in scope.get("headers", ())
+        )
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if want_timing:
+                    elapsed = time.perf_counter() - start
+                    # desc lleva las veces que se repitió la fase (p.ej. idas y vueltas a la BBDD)
+                    parts = [f'{name};desc="x{count}";dur={seconds * 1000:.2f}' if count > 1 else f"{name};dur={seconds * 1000:.2f}"
+                             for name, (seconds, count) in phases.items()]
+                    parts.append(f"total;dur={elapsed * 1000:.2f}")
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", ", ".join(parts).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _phases.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            registry.observe("auth_request_duration_seconds", (("method", scope["method"]), ("route", path), ("status", status_code)), elapsed)
+            for name, (seconds, count) in phases.items():
+                registry.observe("auth_phase_duration_seconds", (("route", path), ("phase", name)), seconds)
+                registry.inc("auth_phase_calls_total", (("route", path), ("phase", name)), count)
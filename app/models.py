@@ -1,8 +1,15 @@
 # auth-service/app/models.py
 from pydantic import BaseModel, Field # Import Field
-from typing import Optional
+from typing import List, Optional
 from datetime import date, datetime # Import datetime
 
+ROLE_ADMIN, ROLE_CLIENTE, ROLE_PROVEEDOR, ROLE_HYBRID = 0, 1, 2, 3
+STATUS_ACTIVO = 'activo'
+ROLE_NAMES = {ROLE_ADMIN: "administrador", ROLE_CLIENTE: "cliente", ROLE_PROVEEDOR: "prestador", ROLE_HYBRID: "híbrido"}
+
+def rol_nombre(id_rol: int) -> str:
+    return ROLE_NAMES.get(id_rol, "desconocido")
+
 class UserCreate(BaseModel):
     rut: str = Field(..., max_length=12)
     nombres: str = Field(..., max_length=100)
@@ -46,4 +53,47 @@ class UserInDB(BaseModel): # Modelo interno completo
 
 class TokenResponse(BaseModel):
     token: str
-    usuario: UserPublic # Usamos el modelo unificado completo
\ No newline at end of file
+    usuario: UserPublic # Usamos el modelo unificado completo
+    refresh_token: Optional[str] = None # Solo con TOKEN_MODE=stateless
+
+class TokenClaims(BaseModel): # Contenido verificado de un access token
+    sub: str
+    rol: Optional[str] = None
+    iat: int
+    exp: int
+
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., max_length=100)
+
+class RefreshResponse(BaseModel):
+    token: str
+    refresh_token: str
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, max_length=1000)
+
+class IntrospectionResult(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    rol: Optional[str] = None
+    iat: Optional[int] = None
+    exp: Optional[int] = None
+    reason: Optional[str] = None # invalid_token | user_not_found | session_expired | inactive_user
+
+class IntrospectResponse(BaseModel):
+    results: List[IntrospectionResult]
+
+class BulkImportError(BaseModel):
+    line: int
+    rut: Optional[str] = None
+    correo: Optional[str] = None
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+
+class AvailabilityResponse(BaseModel):
+    rut_disponible: Optional[bool] = None # None si no se consultó
+    correo_disponible: Optional[bool] = None
@@ -0,0 +1,145 @@
+# app/queries.py
+"""
+Sentencias SQL del servicio sobre Usuarios, Perfil y RefreshTokens.
+
+Cada sentencia tiene nombre y un texto fijo: SQL Server reutiliza el plan
+de una consulta parametrizada solo si el texto es idéntico, así que nada se
+arma con f-strings en el camino caliente (las listas IN se expanden con
+`expand`, que da un texto estable por cantidad de parámetros).
+
+`execute` y `commit` cuentan cada ida y vuelta como fase "db" del request
+(Server-Timing y auth_phase_calls_total{phase="db"}) y por sentencia en
+auth_sql_statements_total.
+"""
+
+from typing import NamedTuple
+
+from app.metrics import METRICS_ENABLED, phase, registry
+
+
+class Statement(NamedTuple):
+    name: str
+    sql: str
+
+
+def execute(cursor, statement: Statement, *params):
+    with phase("db"):
+        cursor.execute(statement.sql, *params)
+    if METRICS_ENABLED:
+        registry.inc("auth_sql_statements_total", (("statement", statement.name),))
+    return cursor
+
+
+def drain(cursor):
+    """
+    Consume los resultados que quedan de un lote. SQL Server solo ejecuta lo
+    que sigue a un resultado cuando el cliente lo pide, así que sin esto el
+    SET NOCOUNT OFF final de un lote no corre y la conexión vuelve al pool
+    con NOCOUNT ON (rowcount = -1).
+    """
+    with phase("db"):
+        while cursor.nextset():
+            pass
+
+
+def commit(conn):
+    with phase("db"):
+        conn.commit()
+
+
+def expand(statement: Statement, count: int) -> Statement:
+    """Rellena el `{}` de una sentencia IN con `count` marcadores."""
+    return Statement(statement.name, statement.sql.format(", ".join("?" * count)))
+
+
+USER_COLUMNS = """
+    id_usuario, nombres, primer_apellido, segundo_apellido, rut, correo,
+    contrasena, direccion, id_rol, estado, foto_url, genero,
+    fecha_nacimiento, token_valido_desde
+"""
+
+# --- LECTURA DE USUARIOS ---
+
+SELECT_USER_BY_ID = Statement("select_user_by_id", f"SELECT {USER_COLUMNS} FROM Usuarios WHERE id_usuario = ?")
+SELECT_USERS_BY_IDS = Statement("select_users_by_ids", f"SELECT {USER_COLUMNS} FROM Usuarios WHERE id_usuario IN ({{}})")
+
+SELECT_LOGIN = Statement("select_login", """
+    SELECT id_usuario, nombres, primer_apellido, segundo_apellido, rut,
+           contrasena, direccion, id_rol, estado, foto_url, genero, fecha_nacimiento,
+           token_valido_desde
+    FROM Usuarios WHERE correo = ?
+""")
+
+# --- LOGIN ---
+
+# Invalida los tokens anteriores del usuario
+TOUCH_SESSION = Statement("touch_session", "UPDATE Usuarios SET token_valido_desde = GETUTCDATE() WHERE id_usuario = ?")
+
+# Modo stateless: además revoca las cadenas de refresh anteriores y emite una nueva, en el mismo lote
+TOUCH_SESSION_WITH_REFRESH = Statement("touch_session_with_refresh", """
+    SET NOCOUNT ON;
+    UPDATE Usuarios SET token_valido_desde = GETUTCDATE() WHERE id_usuario = ?;
+    DELETE FROM RefreshTokens WHERE id_usuario = ?;
+    INSERT INTO RefreshTokens (token_hash, id_usuario, familia, expira) VALUES (?, ?, ?, ?);
+    SET NOCOUNT OFF;
+""")
+
+# --- REGISTRO ---
+
+# Un seek por índice en cada rama (un OR entre columnas impide usar ambos índices). Devuelve
+# hasta dos filas, la del RUT y la de otro usuario con ese correo, así que cubre también
+# "el nuevo correo ya está en uso" del paso a híbrido.
+SELECT_REGISTER_CONFLICTS = Statement("select_register_conflicts", """
+    SELECT 'rut' AS coincide, id_usuario, id_rol, foto_url FROM Usuarios WHERE rut = ?
+    UNION ALL
+    SELECT 'correo' AS coincide, id_usuario, id_rol, foto_url FROM Usuarios WHERE correo = ? AND rut <> ?
+""")
+
+# Prestador que se registra como cliente: pasa a híbrido y devuelve su foto sin re-consultar
+UPGRADE_TO_HYBRID = Statement("upgrade_to_hybrid", """
+    UPDATE Usuarios SET id_rol = ?, nombres = ?, primer_apellido = ?, segundo_apellido = ?, correo = ?,
+           direccion = ?, genero = ?, fecha_nacimiento = ?, token_valido_desde = GETUTCDATE()
+    OUTPUT INSERTED.foto_url
+    WHERE id_usuario = ?
+""")
+
+# Usuario y perfil vacío en un solo lote; el id generado pasa por una variable de tabla.
+# Los lotes usan NOCOUNT para que el único resultado sea el SELECT y lo restauran al final (es de
+# sesión); quien los ejecuta llama a drain() antes del commit para que esa última sentencia corra.
+INSERT_USER_WITH_PROFILE = Statement("insert_user_with_profile", """
+    SET NOCOUNT ON;
+    DECLARE @nuevo TABLE (id_usuario INT, foto_url NVARCHAR(MAX), rut NVARCHAR(12), segundo_apellido NVARCHAR(100), direccion NVARCHAR(255));
+    INSERT INTO Usuarios (rut, nombres, primer_apellido, segundo_apellido, correo, contrasena, direccion, id_rol, estado, genero, fecha_nacimiento, token_valido_desde)
+    OUTPUT INSERTED.id_usuario, INSERTED.foto_url, INSERTED.rut, INSERTED.segundo_apellido, INSERTED.direccion INTO @nuevo
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETUTCDATE());
+    INSERT INTO Perfil (id_usuario) SELECT id_usuario FROM @nuevo;
+    SELECT id_usuario, foto_url, rut, segundo_apellido, direccion FROM @nuevo;
+    SET NOCOUNT OFF;
+""")
+
+# --- REFRESH TOKENS ---
+
+# Marca el token como usado y lee el estado previo en una sola sentencia atómica
+CLAIM_REFRESH_TOKEN = Statement("claim_refresh_token", """
+    UPDATE r SET usado = 1
+    OUTPUT DELETED.usado, INSERTED.id_usuario, INSERTED.familia, INSERTED.expira, u.id_rol, u.estado
+    FROM RefreshTokens r JOIN Usuarios u ON u.id_usuario = r.id_usuario
+    WHERE r.token_hash = ?
+""")
+REVOKE_REFRESH_FAMILY = Statement("revoke_refresh_family", "DELETE FROM RefreshTokens WHERE familia = ?")
+# Los sucesores heredan el vencimiento de la familia: al vencer se borran todas sus filas (usadas o no)
+PURGE_EXPIRED_REFRESH_TOKENS = Statement(
+    "purge_expired_refresh_tokens", "DELETE TOP (?) FROM RefreshTokens WHERE expira < GETUTCDATE()"
+)
+INSERT_REFRESH_TOKEN = Statement(
+    "insert_refresh_token", "INSERT INTO RefreshTokens (token_hash, id_usuario, familia, expira) VALUES (?, ?, ?, ?)"
+)
+
+# --- DISPONIBILIDAD ---
+
+COUNT_USERS = Statement("count_users", "SELECT COUNT_BIG(*) FROM Usuarios")
+SELECT_ALL_RUT_CORREO = Statement("select_all_rut_correo", "SELECT rut, correo FROM Usuarios")
+SELECT_ROL_BY_RUT = Statement("select_rol_by_rut", "SELECT id_rol FROM Usuarios WHERE rut = ?")
+CORREO_EXISTS = Statement("correo_exists", "SELECT 1 FROM Usuarios WHERE correo = ?")
+# Como SELECT_REGISTER_CONFLICTS: el correo del dueño del RUT no choca (paso a híbrido)
+CORREO_EXISTS_OTHER_RUT = Statement("correo_exists_other_rut", "SELECT 1 FROM Usuarios WHERE correo = ? AND rut <> ?")
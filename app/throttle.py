@@ -0,0 +1,326 @@
+# app/throttle.py
+"""
+Límite de intentos de login por IP y por correo, para que un ataque de
+credential stuffing no convierta bcrypt en un arma contra nuestra CPU.
+
+Cada clave (ip:<dirección>, correo:<correo>) tiene un token bucket de
+intentos y un contador de fallos recientes que olvida un fallo cada
+window / max_failures segundos (una ventana deslizante aproximada). Al llegar al máximo de fallos la clave queda bloqueada
+LOGIN_LOCKOUT_BASE segundos, el doble en cada bloqueo siguiente (hasta
+LOGIN_LOCKOUT_MAX). La cuenta de bloqueos vuelve a cero si pasa una ventana
+completa desde que venció el último sin volver a bloquearse, así una red
+compartida con errores de tipeo esporádicos no escala para siempre. El chequeo ocurre antes de
+pedir conexión a la BBDD o de hashear nada, y un rechazo cuesta un lock y
+un dict.
+
+El estado en memoria es por worker y está acotado (LRU). Con
+LOGIN_THROTTLE_REDIS_URL el estado se comparte entre workers e instancias;
+si Redis falla se sigue limitando con el estado local.
+
+La IP es la del socket. Con LOGIN_THROTTLE_TRUST_PROXY=1 (solo detrás de un
+router que agrega X-Forwarded-For, como el de la plataforma: ver Procfile)
+sale de la última entrada de ese header; sin proxy cualquiera podría elegir
+su IP con él. No se usa --forwarded-allow-ips='*' de uvicorn porque, si
+confía en todos, toma la primera entrada, que la controla el cliente.
+
+Nota: el bloqueo por correo permite a un atacante bloquear temporalmente la
+cuenta de otro; por eso es corto y el umbral de fallos bajo por correo y
+alto por IP (las IP de oficinas y redes móviles se comparten).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Annotated, NamedTuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordRequestForm
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOGIN_THROTTLE_ENABLED = os.environ.get("LOGIN_THROTTLE_ENABLED", "1") != "0"
+LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+LOGIN_THROTTLE_STATE_TTL = float(os.environ.get("LOGIN_THROTTLE_STATE_TTL", "3600"))   # olvida claves inactivas
+LOGIN_THROTTLE_REDIS_URL = os.environ.get("LOGIN_THROTTLE_REDIS_URL")
+# Detrás del router de la plataforma request.client es el router: sin X-Forwarded-For todos
+# los usuarios compartirían la clave de IP. Poner 1 solo detrás de un proxy que agregue el header.
+LOGIN_THROTTLE_TRUST_PROXY = os.environ.get("LOGIN_THROTTLE_TRUST_PROXY", "0") == "1"
+LOGIN_LOCKOUT_BASE = float(os.environ.get("LOGIN_LOCKOUT_BASE", "30"))
+LOGIN_LOCKOUT_MAX = float(os.environ.get("LOGIN_LOCKOUT_MAX", "900"))
+
+
+class Limit(NamedTuple):
+    rate: float          # intentos repuestos por segundo
+    burst: float         # capacidad del bucket
+    max_failures: int    # fallos dentro de la ventana antes de bloquear
+    window: float        # segundos en que se olvidan max_failures fallos
+
+
+IP_LIMIT = Limit(
+    rate=float(os.environ.get("LOGIN_IP_PER_MINUTE", "60")) / 60,
+    burst=float(os.environ.get("LOGIN_IP_BURST", "20")),
+    max_failures=int(os.environ.get("LOGIN_IP_MAX_FAILURES", "50")),
+    window=float(os.environ.get("LOGIN_IP_FAILURE_WINDOW", "900")),
+)
+CORREO_LIMIT = Limit(
+    rate=float(os.environ.get("LOGIN_CORREO_PER_MINUTE", "6")) / 60,
+    burst=float(os.environ.get("LOGIN_CORREO_BURST", "5")),
+    max_failures=int(os.environ.get("LOGIN_CORREO_MAX_FAILURES", "5")),
+    window=float(os.environ.get("LOGIN_CORREO_FAILURE_WINDOW", "900")),
+)
+
+
+def lockout_seconds(lockouts: int) -> float:
+    return min(LOGIN_LOCKOUT_BASE * 2 ** (lockouts - 1), LOGIN_LOCKOUT_MAX)
+
+
+def leak_failures(failures: int, since: float, limit: Limit, now: float):
+    """Olvida un fallo por cada window / max_failures segundos desde `since`. Devuelve (fallos, since)."""
+    interval = limit.window / limit.max_failures
+    leaked = int((now - since) / interval)
+    if leaked >= failures:
+        return 0, now
+    return failures - leaked, since + leaked * interval
+
+
+class MemoryBackend:
+    """Estado local acotado: {clave: [tokens, actualizado, fallos, bloqueado_hasta, bloqueos, fallos_actualizado]}."""
+    blocking = False
+
+    def __init__(self, max_keys: int = LOGIN_THROTTLE_MAX_KEYS, state_ttl: float = LOGIN_THROTTLE_STATE_TTL):
+        self.max_keys = max_keys
+        self.state_ttl = state_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def _entry(self, key: str, limit: Limit, now: float):
+        entry = self._data.get(key)
+        if entry is None or (now - entry[1] > self.state_ttl and entry[3] <= now):
+            entry = self._data[key] = [limit.burst, now, 0, 0.0, 0, now]
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+                self._evictions += 1
+        self._data.move_to_end(key)
+        return entry
+
+    def attempt(self, key: str, limit: Limit, now: float) -> float:
+        """Consume un intento. Devuelve 0 si se permite o los segundos a esperar."""
+        with self._lock:
+            entry = self._entry(key, limit, now)
+            if entry[3] > now:
+                return entry[3] - now
+            tokens = min(limit.burst, entry[0] + (now - entry[1]) * limit.rate)
+            entry[1] = now
+            if tokens < 1:
+                entry[0] = tokens
+                return (1 - tokens) / limit.rate
+            entry[0] = tokens - 1
+            return 0.0
+
+    def failure(self, key: str, limit: Limit, now: float):
+        with self._lock:
+            entry = self._entry(key, limit, now)
+            failures, entry[5] = leak_failures(entry[2], entry[5], limit, now)
+            failures += 1
+            if entry[4] and entry[3] + limit.window <= now:
+                entry[4] = 0   # El último bloqueo venció hace más de una ventana
+            if failures >= limit.max_failures:
+                failures = 0
+                entry[4] += 1
+                entry[3] = now + lockout_seconds(entry[4])
+            entry[2] = failures
+
+    def success(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                entry[2] = entry[4] = 0
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "keys": len(self._data),
+                "max_keys": self.max_keys,
+                "locked": sum(1 for entry in self._data.values() if entry[3] > now),
+                "evictions": self._evictions,
+            }
+
+
+# Mismo algoritmo que MemoryBackend, atómico en Redis. Devuelven cadenas porque
+# Redis trunca a entero los números que devuelve Lua.
+_ATTEMPT_SCRIPT = """
+local now, rate, burst, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local s = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'locked_until')
+local locked = tonumber(s[3]) or 0
+if locked > now then return tostring(locked - now) end
+local tokens = tonumber(s[1]) or burst
+local ts = tonumber(s[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens < 1 then wait = (1 - tokens) / rate else tokens = tokens - 1 end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+return tostring(wait)
+"""
+_FAILURE_SCRIPT = """
+local now, max_failures, window = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local base, max_lock, ttl = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local s = redis.call('HMGET', KEYS[1], 'failures', 'failures_ts', 'lockouts', 'locked_until')
+local failures = tonumber(s[1]) or 0
+local ts = tonumber(s[2]) or now
+local interval = window / max_failures
+local leaked = math.floor((now - ts) / interval)
+if leaked >= failures then failures, ts = 0, now else failures, ts = failures - leaked, ts + leaked * interval end
+failures = failures + 1
+local lockouts = tonumber(s[3]) or 0
+if lockouts > 0 and (tonumber(s[4]) or 0) + window <= now then lockouts = 0 end
+if failures >= max_failures then
+    failures = 0
+    lockouts = lockouts + 1
+    local lock = math.min(base * 2 ^ (lockouts - 1), max_lock)
+    redis.call('HSET', KEYS[1], 'locked_until', tostring(now + lock))
+end
+redis.call('HSET', KEYS[1], 'failures', failures, 'failures_ts', tostring(ts), 'lockouts', lockouts)
+redis.call('EXPIRE', KEYS[1], ttl)
+return 0
+"""
+
+
+class RedisBackend:
+    """Estado compartido entre workers. Ante errores de Redis delega en un MemoryBackend local."""
+    blocking = True   # E/S de red: desde código async se llama en el threadpool
+
+    def __init__(self, url: str, prefix: str = "login-throttle:"):
+        import redis  # Dependencia opcional: solo si se configura LOGIN_THROTTLE_REDIS_URL
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.2)
+        self._attempt = self._client.register_script(_ATTEMPT_SCRIPT)
+        self._failure = self._client.register_script(_FAILURE_SCRIPT)
+        self._error = redis.RedisError
+        self._prefix = prefix
+        self._ttl = int(max(LOGIN_THROTTLE_STATE_TTL, LOGIN_LOCKOUT_MAX + max(IP_LIMIT.window, CORREO_LIMIT.window)))
+        self.fallback = MemoryBackend()
+        self.errors = 0
+
+    def _failed(self, ex):
+        self.errors += 1
+        logger.warning("Redis no disponible para el límite de login, se usa el estado local: %s", ex)
+
+    def attempt(self, key: str, limit: Limit, now: float) -> float:
+        try:
+            return float(self._attempt(keys=[self._prefix + key], args=[now, limit.rate, limit.burst, self._ttl]))
+        except self._error as ex:
+            self._failed(ex)
+            return self.fallback.attempt(key, limit, now)
+
+    def failure(self, key: str, limit: Limit, now: float):
+        try:
+            self._failure(keys=[self._prefix + key],
+                          args=[now, limit.max_failures, limit.window, LOGIN_LOCKOUT_BASE, LOGIN_LOCKOUT_MAX, self._ttl])
+        except self._error as ex:
+            self._failed(ex)
+            self.fallback.failure(key, limit, now)
+
+    def success(self, key: str):
+        try:
+            pipe = self._client.pipeline()
+            pipe.hset(self._prefix + key, mapping={"failures": 0, "lockouts": 0})
+            pipe.expire(self._prefix + key, self._ttl)
+            pipe.execute()
+        except self._error as ex:
+            self._failed(ex)
+            self.fallback.success(key)
+
+    def stats(self) -> dict:
+        return {**self.fallback.stats(), "redis_errors": self.errors}
+
+
+class LoginThrottle:
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+
+    @staticmethod
+    def _keys(ip: str, correo: str):
+        return (("ip", "ip:" + ip, IP_LIMIT), ("correo", "correo:" + correo.strip().lower(), CORREO_LIMIT))
+
+    def check(self, ip: str, correo: str):
+        """Lanza 429 con Retry-After si la IP o el correo superaron su límite o están bloqueados."""
+        if not self.enabled:
+            return
+        now = time.time()
+        for kind, key, limit in self._keys(ip, correo):
+            wait = self.backend.attempt(key, limit, now)
+            if wait > 0:
+                registry.inc("auth_login_throttled_total", (("key", kind),))
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Demasiados intentos de inicio de sesión. Intenta más tarde.",
+                    headers={"Retry-After": str(max(1, round(wait)))},
+                )
+
+    def failure(self, ip: str, correo: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        for _, key, limit in self._keys(ip, correo):
+            self.backend.failure(key, limit, now)
+
+    def success(self, ip: str, correo: str):
+        # Solo se limpia el correo: en un ataque desde una IP algunas credenciales sí aciertan
+        if self.enabled:
+            self.backend.success(self._keys(ip, correo)[1][1])
+
+    async def check_async(self, ip: str, correo: str):
+        """check() para endpoints async: solo pasa al threadpool si el backend hace E/S."""
+        if self.backend.blocking:
+            await run_in_threadpool(self.check, ip, correo)
+        else:
+            self.check(ip, correo)
+
+    async def record(self, ip: str, correo: str, success: bool):
+        """failure()/success() para endpoints async, sin bloquear el event loop si el backend hace E/S."""
+        fn = self.success if success else self.failure
+        if self.backend.blocking:
+            await run_in_threadpool(fn, ip, correo)
+        else:
+            fn(ip, correo)
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self.backend.stats()}
+
+
+def _create_backend():
+    if LOGIN_THROTTLE_REDIS_URL:
+        return RedisBackend(LOGIN_THROTTLE_REDIS_URL)
+    return MemoryBackend()
+
+
+login_throttle = LoginThrottle(_create_backend(), LOGIN_THROTTLE_ENABLED)
+
+
+def client_ip(request: Request) -> str:
+    if LOGIN_THROTTLE_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # La última entrada la agrega nuestro proxy; las anteriores las controla el cliente
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "desconocida"
+
+
+async def check_login_throttle(request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> str:
+    """
+    Dependencia de /auth/login: rechaza antes de tocar la BBDD o bcrypt y
+    devuelve la IP del cliente. Con el backend en memoria no ocupa ningún
+    hilo; con Redis la consulta va al threadpool.
+    """
+    ip = client_ip(request)
+    await login_throttle.check_async(ip, form_data.username)
+    return ip
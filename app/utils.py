@@ -17,4 +17,31 @@ def validar_rut(rut: str) -> bool:
     resto = 11 - (suma % 11)
     dv_esperado = "0" if resto == 11 else "K" if resto == 10 else str(resto)
 
-    return dv == dv_esperado
\ No newline at end of file
+    return dv == dv_esperado
+
+_RUT_SEPARADORES = str.maketrans("", "", ".-")
+_RUT_PESOS = (2, 3, 4, 5, 6, 7) * 4   # cubre cuerpos de hasta 24 dígitos sin ciclar
+_RUT_DV = "0K987654321"               # dígito esperado indexado por suma % 11
+
+def normalizar_rut(rut: str) -> str:
+    """Quita puntos y guion y pasa a mayúsculas (misma limpieza que validar_rut)."""
+    return rut.translate(_RUT_SEPARADORES).upper()
+
+def validar_ruts(ruts) -> list[bool]:
+    """
+    Versión por lotes de validar_rut para importaciones masivas: misma regla,
+    pero con pesos y tabla de dígitos precalculados.
+    """
+    resultados = []
+    for rut in ruts:
+        rut = rut.translate(_RUT_SEPARADORES).upper()
+        cuerpo = rut[:-1]
+        if len(cuerpo) > len(_RUT_PESOS):
+            resultados.append(validar_rut(rut))
+            continue
+        if not cuerpo.isdigit() or len(rut) < 8:
+            resultados.append(False)
+            continue
+        suma = sum(int(d) * p for d, p in zip(reversed(cuerpo), _RUT_PESOS))
+        resultados.append(rut[-1] == _RUT_DV[suma % 11])
+    return resultados
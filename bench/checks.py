@@ -0,0 +1,327 @@
+# bench/checks.py
+"""
+Comprobaciones de comportamiento, deterministas y baratas (sin BBDD ni red),
+de las piezas cuya corrección no se ve en un benchmark:
+
+    - cache:    un set() con una lectura anterior a un invalidate() se descarta
+    - rut:      validar_ruts da lo mismo que validar_rut, fila a fila
+    - throttle: olvido de fallos, bloqueos exponenciales y su reinicio
+    - pool:     cuentas de checkouts, timeouts y conexiones descartadas
+
+El tiempo se controla con un reloj falso, así que no hay esperas.
+
+Uso:
+    python -m bench.checks
+    python -m bench.checks cache rut
+
+Sale con código 1 si alguna comprobación falla, para poder usarlo en CI.
+"""
+
+import argparse
+import random
+import sys
+import traceback
+
+import pyodbc
+
+from app import cache as cache_module
+from app import database
+from app.cache import TTLCache
+from app.database import ConnectionPool, PoolTimeoutError
+from app.throttle import LOGIN_LOCKOUT_BASE, LOGIN_LOCKOUT_MAX, Limit, MemoryBackend, leak_failures, lockout_seconds
+from app.utils import validar_rut, validar_ruts
+
+
+class FakeClock:
+    """Reemplaza al módulo time donde se usa time.monotonic() / time.time()."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    time = monotonic
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+# --- CACHÉ ---
+
+def check_cache():
+    clock = FakeClock()
+    cache_module.time, real_time = clock, cache_module.time
+    try:
+        cache = TTLCache(maxsize=10, ttl=30)
+
+        # Un request lee el usuario, un login lo invalida y el request intenta guardarlo
+        generation = cache.generation()
+        cache.invalidate(1)
+        cache.set(1, "token_valido_desde viejo", generation)
+        assert cache.get(1) is None, "se repuso un valor leído antes del invalidate()"
+        assert cache.stats()["stale_sets"] == 1
+
+        # La lectura siguiente (después del invalidate) sí se guarda
+        cache.set(1, "nuevo", cache.generation())
+        assert cache.get(1) == "nuevo"
+
+        # Invalidar otra clave no descarta la carga de esta
+        generation = cache.generation()
+        cache.invalidate(2)
+        cache.set(3, "otro", generation)
+        assert cache.get(3) == "otro"
+
+        # Sin generación (escritura directa) no hay control
+        cache.invalidate(4)
+        cache.set(4, "directo")
+        assert cache.get(4) == "directo"
+
+        # Pasado el ttl la invalidación se olvida; una carga aún más vieja se descarta igual
+        generation = cache.generation()
+        cache.invalidate(5)
+        clock.advance(31)
+        cache.invalidate(6)   # purga las invalidaciones de hace más de ttl
+        cache.set(5, "viejo", generation)
+        assert cache.get(5) is None, "se repuso un valor anterior a una invalidación olvidada"
+        cache.set(5, "fresco", cache.generation())
+        assert cache.get(5) == "fresco"
+
+        # Expiración por ttl
+        clock.advance(31)
+        assert cache.get(5) is None
+    finally:
+        cache_module.time = real_time
+
+
+# --- RUT ---
+
+def _result(fn, rut):
+    try:
+        return fn(rut)
+    except Exception as e:
+        return type(e)
+
+
+def _dv(cuerpo: str) -> str:
+    suma = sum(int(d) * (2 + i % 6) for i, d in enumerate(reversed(cuerpo)))
+    resto = 11 - suma % 11
+    return "0" if resto == 11 else "K" if resto == 10 else str(resto)
+
+
+def _formatear(cuerpo: str, dv: str, rng: random.Random) -> str:
+    if rng.random() < 0.3:
+        grupos = []
+        while cuerpo:
+            cuerpo, grupos = cuerpo[:-3], [cuerpo[-3:]] + grupos
+        cuerpo = ".".join(grupos)
+    dv = dv.lower() if rng.random() < 0.3 else dv
+    return f"{cuerpo}-{dv}" if rng.random() < 0.7 else cuerpo + dv
+
+
+def check_rut(samples: int = 20000):
+    rng = random.Random(1234)
+    ruts = ["", "-", "K", "1-9", "1234567-K", "12.345.678-5", "12345678-5", "12345678-k", " 12345678-5",
+            "12345678-55", "abcdefgh-1", "1234567８-5", "١٢٣٤٥٦٧٨-٥", "²2345678-5", "1" * 24 + "-1", "1" * 30 + "-5"]
+    for _ in range(samples):
+        cuerpo = str(rng.randrange(1, 10 ** rng.randint(1, 26)))
+        dv = _dv(cuerpo) if rng.random() < 0.5 else rng.choice("0123456789Kk")
+        ruts.append(_formatear(cuerpo, dv, rng))
+    for rut in ruts:
+        esperado = _result(validar_rut, rut)
+        obtenido = _result(lambda r: validar_ruts([r])[0], rut)
+        assert esperado == obtenido, f"{rut!r}: validar_rut={esperado} validar_ruts={obtenido}"
+    validos = [rut for rut in ruts if _result(validar_rut, rut) is True]
+    assert validos and validar_ruts(validos) == [True] * len(validos)
+
+
+# --- THROTTLE ---
+
+def check_throttle():
+    limit = Limit(rate=1.0, burst=2, max_failures=5, window=900)   # olvida un fallo cada 180 s
+
+    assert leak_failures(3, 0, limit, 179) == (3, 0)
+    assert leak_failures(3, 0, limit, 180) == (2, 180)
+    assert leak_failures(3, 0, limit, 400) == (1, 360)    # el resto de intervalo no se pierde
+    assert leak_failures(3, 0, limit, 540) == (0, 540)
+    assert leak_failures(0, 0, limit, 10) == (0, 10)
+
+    # Token bucket: burst intentos seguidos, luego uno por segundo
+    backend = MemoryBackend()
+    assert backend.attempt("k", limit, 0) == 0 and backend.attempt("k", limit, 0) == 0
+    assert backend.attempt("k", limit, 0) == 1.0
+    assert backend.attempt("k", limit, 1) == 0
+
+    # max_failures fallos seguidos bloquean LOGIN_LOCKOUT_BASE; el siguiente bloqueo dura el doble
+    backend, now = MemoryBackend(), 0.0
+    for _ in range(4):
+        backend.failure("c", limit, now)
+    assert backend.attempt("c", limit, now) == 0
+    backend.failure("c", limit, now)
+    assert backend.attempt("c", limit, now) == LOGIN_LOCKOUT_BASE
+    now += LOGIN_LOCKOUT_BASE
+    for _ in range(5):
+        backend.failure("c", limit, now)
+    assert backend.attempt("c", limit, now) == min(2 * LOGIN_LOCKOUT_BASE, LOGIN_LOCKOUT_MAX)
+
+    # Una ventana completa sin bloquearse desde que venció el último: la cuenta vuelve a cero
+    now = backend._data["c"][3] + limit.window
+    for _ in range(5):
+        backend.failure("c", limit, now)
+    assert backend.attempt("c", limit, now) == lockout_seconds(1) == min(LOGIN_LOCKOUT_BASE, LOGIN_LOCKOUT_MAX)
+
+    # Fallos espaciados al ritmo del olvido nunca bloquean
+    backend = MemoryBackend()
+    for i in range(50):
+        backend.failure("lento", limit, i * 180.0)
+    assert backend._data["lento"][2] == 1 and backend._data["lento"][4] == 0
+
+    # Un login correcto limpia fallos y bloqueos del correo
+    backend.failure("lento", limit, 50 * 180.0)
+    backend.success("lento")
+    assert backend._data["lento"][2] == backend._data["lento"][4] == 0
+
+    assert lockout_seconds(50) == LOGIN_LOCKOUT_MAX
+
+
+# --- POOL ---
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, *params):
+        if self.connection.dead:
+            raise pyodbc.Error("08S01", "conexión caída")
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.dead = False
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_rollback = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise pyodbc.Error("08S01", "conexión caída")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def check_pool():
+    clock = FakeClock()
+    database.time, real_time = clock, database.time
+    try:
+        pool = ConnectionPool(FakeConnection, min_size=0, max_size=2, timeout=0, recycle=60, ping_after=10)
+
+        def expect(**values):
+            stats = pool.stats()
+            assert {key: stats[key] for key in values} == values, f"esperado {values}, hay {stats}"
+
+        # Reutiliza la conexión devuelta y hace rollback al devolverla
+        with pool.connection() as first:
+            pass
+        with pool.connection() as again:
+            assert again is first
+        assert first.rollbacks == 2
+        expect(size=1, idle=1, in_use=0, checkouts=2, created=1, discarded=0)
+
+        # Con las dos en uso, un tercer checkout agota el tiempo sin cambiar las cuentas
+        a, b = pool.acquire(), pool.acquire()
+        expect(size=2, in_use=2, idle=0)
+        try:
+            pool.acquire()
+            raise AssertionError("se obtuvo una tercera conexión con max_size=2")
+        except PoolTimeoutError:
+            pass
+        expect(size=2, in_use=2, timeouts=1, checkouts=4)
+        pool.release(a)
+        pool.release(b)
+        expect(size=2, in_use=0, idle=2)
+
+        # Un error del driver descarta la conexión; otro error la devuelve al pool
+        try:
+            with pool.connection() as conn:
+                raise pyodbc.Error("HY000", "falla")
+        except pyodbc.Error:
+            pass
+        assert conn.closed
+        expect(size=1, idle=1, discarded=1)
+        try:
+            with pool.connection():
+                raise ValueError("falla de la app")
+        except ValueError:
+            pass
+        expect(size=1, idle=1, discarded=1)
+
+        # Si el rollback al devolverla falla, se descarta
+        entry = pool.acquire()
+        entry.conn.fail_rollback = True
+        pool.release(entry)
+        expect(size=0, idle=0, in_use=0, discarded=2)
+
+        # Ociosa más de ping_after y caída: se descarta y se abre otra en su lugar
+        entry = pool.acquire()
+        pool.release(entry)
+        entry.conn.dead = True
+        clock.advance(11)
+        with pool.connection() as conn:
+            assert conn is not entry.conn
+        expect(size=1, discarded=3, created=4)
+
+        # Más antigua que recycle: se cierra al sacarla aunque esté viva
+        clock.advance(61)
+        old = pool._idle[-1].conn
+        with pool.connection() as conn:
+            assert conn is not old and old.closed
+        expect(size=1, in_use=0, idle=1, discarded=4, created=5, checkouts=10)
+
+        pool.close()
+        expect(size=0, idle=0)
+    finally:
+        database.time = real_time
+
+
+CHECKS = {
+    "cache": check_cache,
+    "rut": check_rut,
+    "throttle": check_throttle,
+    "pool": check_pool,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comprobaciones de comportamiento deterministas")
+    parser.add_argument("names", nargs="*", help=f"por defecto, todas: {', '.join(CHECKS)}")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(CHECKS)
+    if unknown:
+        parser.error(f"comprobaciones desconocidas: {', '.join(sorted(unknown))}")
+
+    failed = 0
+    for name in args.names or CHECKS:
+        try:
+            CHECKS[name]()
+            print(f"ok     {name}")
+        except Exception:
+            failed += 1
+            print(f"FALLA  {name}")
+            traceback.print_exc()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# bench/compare.py
+"""
+Compara dos resultados de bench.run y marca regresiones.
+
+Uso:
+    python -m bench.compare antes.json despues.json [--threshold 10]
+
+Sale con código 1 si alguna operación empeora su p95 o su throughput más
+allá del umbral (en %), para poder usarlo en CI.
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = (
+    # (etiqueta, extractor, True si mayor es mejor)
+    ("req/s", lambda s: s["throughput"], True),
+    ("p50 ms", lambda s: s["latency_ms"]["p50"], False),
+    ("p95 ms", lambda s: s["latency_ms"]["p95"], False),
+    ("p99 ms", lambda s: s["latency_ms"]["p99"], False),
+    ("bcrypt", lambda s: s["bcrypt_share"], None),
+    ("rt/req", lambda s: s["db_round_trips_per_request"], False),
+)
+GATED = {"req/s", "p95 ms"}
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def change(before: float, after: float):
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: dict, after: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"antes:   {before['meta']['commit']}  {before['meta']['timestamp']}")
+    print(f"después: {after['meta']['commit']}  {after['meta']['timestamp']}")
+    if before["meta"]["config"] != after["meta"]["config"]:
+        print("aviso: las corridas usan configuraciones distintas")
+
+    for name, old in before["overall"]["scenarios"].items():
+        new = after["overall"]["scenarios"].get(name)
+        if new is None:
+            continue
+        print(f"\n{name}")
+        for label, extract, higher_is_better in METRICS:
+            a, b = extract(old), extract(new)
+            pct = change(a, b)
+            mark = ""
+            if pct is not None and higher_is_better is not None:
+                worse = -pct if higher_is_better else pct
+                if worse > threshold:
+                    mark = "  REGRESIÓN" if label in GATED else "  peor"
+                    if label in GATED:
+                        regressions.append(f"{name} {label} {pct:+.1f}%")
+                elif worse < -threshold:
+                    mark = "  mejora"
+            pct_text = f"{pct:+7.1f}%" if pct is not None else "     n/a"
+            print(f"  {label:<7} {a:>10.2f} -> {b:>10.2f}  {pct_text}{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dos resultados de bench.run")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="tolerancia en %% antes de marcar regresión")
+    args = parser.parse_args(argv)
+
+    regressions = compare(load(args.before), load(args.after), args.threshold)
+    if regressions:
+        print("\nRegresiones: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+# bench/fakedb.py
+"""
+Sustituto local de SQL Server para benchmarks: una BBDD SQLite (archivo en
+modo WAL, una conexión SQLite por conexión del pool) detrás de una interfaz
+compatible con la parte de pyodbc que usa el servicio (Row con acceso por
+atributo y cursor_description, execute con parámetros posicionales,
+executemany, fetch*, commit/rollback).
+
+Traduce el T-SQL que emite el servicio (GETUTCDATE, INSERT ... OUTPUT,
+UPDATE alias ... OUTPUT ... FROM ... JOIN, DELETE TOP, COUNT_BIG, lotes
+separados por ';') y simula la latencia de red: cada ida y
+vuelta duerme `latency_ms` y abrir una conexión duerme `connect_latency_ms`
+(handshake ODBC/TLS). Cada ida y vuelta se anota como fase "db_roundtrip"
+del request en curso, de modo que el benchmark puede contarlas por ruta.
+
+Como SQL Server, un lote se detiene en cada resultado y lo que sigue solo
+corre con nextset() (si el cursor se cierra o re-ejecuta antes, no corre), y
+SET NOCOUNT es de la conexión: con NOCOUNT ON rowcount vale -1.
+"""
+
+import itertools
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+import pyodbc
+
+from app.metrics import record_phase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Usuarios (
+    id_usuario         INTEGER PRIMARY KEY AUTOINCREMENT,
+    rut                TEXT NOT NULL UNIQUE,
+    nombres            TEXT NOT NULL,
+    primer_apellido    TEXT NOT NULL,
+    segundo_apellido   TEXT,
+    correo             TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    contrasena         TEXT NOT NULL,
+    direccion          TEXT,
+    id_rol             INT NOT NULL,
+    estado             TEXT NOT NULL,
+    foto_url           TEXT NOT NULL DEFAULT '/static/avatar.png',
+    genero             TEXT,
+    fecha_nacimiento   DATE,
+    token_valido_desde DATETIME2
+);
+CREATE TABLE IF NOT EXISTS Perfil (
+    id_perfil  INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_usuario INT NOT NULL UNIQUE REFERENCES Usuarios (id_usuario)
+);
+CREATE TABLE IF NOT EXISTS RefreshTokens (
+    token_hash BLOB PRIMARY KEY,
+    id_usuario INT NOT NULL,
+    familia    BLOB NOT NULL,
+    expira     DATETIME2 NOT NULL,
+    usado      INT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS IX_RefreshTokens_id_usuario ON RefreshTokens (id_usuario);
+CREATE INDEX IF NOT EXISTS IX_RefreshTokens_expira ON RefreshTokens (expira);
+"""
+
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+sqlite3.register_converter("DATETIME2", lambda b: datetime.fromisoformat(b.decode()))
+
+_OUTPUT = re.compile(r"\bOUTPUT\s+(.*?)\s+((?:VALUES|WHERE)\b.*)$", re.S | re.I)
+_OUTPUT_INTO = re.compile(r"\bOUTPUT\s+(.*?)\s+INTO\s+(\w+)\s+(VALUES\b.*)$", re.S | re.I)
+_DECLARE_TABLE = re.compile(r"^DECLARE\s+@(\w+)\s+TABLE\s*\((.*)\)$", re.S | re.I)
+_TABLE_VARIABLE = re.compile(r"@(\w+)")
+_UPDATE_FROM = re.compile(r"^UPDATE\s+(\w+)\s+SET\s+(.*?)\s+OUTPUT\s+(.*?)\s+(FROM\b.*)$", re.S | re.I)
+_DELETE_TOP = re.compile(r"^DELETE\s+TOP\s*\(\?\)\s+FROM\s+(\w+)\s+WHERE\s+(.*)$", re.S | re.I)
+
+
+def translate(sql: str) -> str:
+    """Sentencia T-SQL del servicio -> SQLite (OUTPUT pasa a RETURNING al final)."""
+    sql = sql.replace("GETUTCDATE()", "strftime('%Y-%m-%d %H:%M:%f', 'now')").replace("COUNT_BIG", "COUNT")
+    # El único parámetro (el TOP) pasa al LIMIT: el WHERE de las sentencias del servicio no lleva parámetros
+    sql = _DELETE_TOP.sub(r"DELETE FROM \1 WHERE rowid IN (SELECT rowid FROM \1 WHERE \2 LIMIT ?)", sql.strip())
+    match = _OUTPUT.search(sql)
+    if match:
+        columns = re.sub(r"\bINSERTED\.", "", match.group(1))
+        sql = f"{sql[:match.start()]}{match.group(2)} RETURNING {columns}"
+    return sql
+
+
+def split_batch(sql: str) -> list[str]:
+    """Separa un lote T-SQL en sentencias (no hay ';' dentro de literales en el servicio)."""
+    return [part.strip() for part in sql.split(";") if part.strip()]
+
+
+class Row(tuple):
+    """Equivalente mínimo a pyodbc.Row."""
+
+    def __new__(cls, values, description, index):
+        row = super().__new__(cls, values)
+        row.cursor_description = description
+        row._index = index
+        return row
+
+    def __getattr__(self, name):
+        try:
+            return self[self._index[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class Cursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection._db.cursor()
+        self._description = None
+        self._index = None
+        self.fast_executemany = False
+        self.rowcount = -1
+        self._output = None     # (filas, description) de un UPDATE ... OUTPUT ... FROM emulado
+        self._pending = []      # sentencias del lote que esperan a nextset()
+
+    @property
+    def description(self):
+        return self._description
+
+    def _round_trip(self):
+        # Con autocommit=False SQL Server corre en modo de transacciones implícitas:
+        # cualquier sentencia, también un SELECT, deja una transacción abierta
+        self._connection._in_transaction = True
+        self._connection._round_trip()
+
+    def execute(self, sql: str, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        self._round_trip()
+        self._pending = []
+        offset = 0
+        for statement in split_batch(sql):
+            needed = statement.count("?")
+            self._pending.append((statement, params[offset:offset + needed]))
+            offset += needed
+        self._advance()
+        return self
+
+    def nextset(self) -> bool:
+        # Lo que quedaba del lote ya viene en camino: no es otra ida y vuelta
+        return self._advance()
+
+    def _advance(self) -> bool:
+        """Corre el lote hasta el próximo resultado. Devuelve si hay uno."""
+        self._output = None
+        description = None
+        try:
+            while self._pending and description is None:
+                statement, params = self._pending.pop(0)
+                description = self._run(statement, params)
+        except sqlite3.IntegrityError as e:
+            self._pending = []
+            raise pyodbc.IntegrityError("23000", str(e)) from e
+        except sqlite3.Error as e:
+            self._pending = []
+            raise pyodbc.Error("HY000", str(e)) from e
+        if self._output is not None:
+            rows, description = self._output
+            self._output = iter(rows)
+            self.rowcount = len(rows)
+        else:
+            self.rowcount = self._cursor.rowcount
+        if self._connection._nocount:
+            self.rowcount = -1
+        self._set_description(description)
+        return description is not None
+
+    def _run(self, statement: str, params: tuple):
+        """Ejecuta una sentencia; devuelve la description de su resultado o None si no tiene."""
+        if statement.upper().startswith("SET NOCOUNT"):
+            self._connection._nocount = statement.upper().endswith("ON")
+            return None
+        # Variables de tabla -> tablas temporales de la conexión
+        declare = _DECLARE_TABLE.match(statement)
+        if declare:
+            name, columns = declare.groups()
+            self._cursor.execute(f"DROP TABLE IF EXISTS temp.tv_{name}")
+            self._cursor.execute(f"CREATE TEMP TABLE tv_{name} ({columns.replace('(MAX)', '')})")
+            return None
+        statement = _TABLE_VARIABLE.sub(r"tv_\1", statement)
+        update = _UPDATE_FROM.match(statement)
+        if update:
+            # SQLite no deja leer en RETURNING las tablas del FROM ni los valores previos (DELETED):
+            # se leen antes con un SELECT y luego se actualiza. INSERTED.x da el valor previo, así
+            # que solo sirve para columnas que el SET no toca (como en las sentencias del servicio).
+            alias, assignments, columns, source = update.groups()
+            columns = re.sub(r"\b(?:INSERTED|DELETED)\.", f"{alias}.", columns)
+            table = re.search(rf"\bFROM\s+(\w+)\s+{alias}\b", source, re.I).group(1)
+            selected = self._connection._db.execute(translate(f"SELECT {columns} {source}"), params)
+            rows = selected.fetchall()
+            description = selected.description
+            self._connection._db.execute(
+                translate(f"UPDATE {table} SET {assignments} WHERE rowid IN (SELECT {alias}.rowid {source})"), params
+            )
+            self._output = (rows, description)
+            return description
+        into = _OUTPUT_INTO.search(statement)
+        if into:
+            columns, table, values = into.groups()
+            columns = re.sub(r"\bINSERTED\.", "", columns)
+            rows = self._connection._db.execute(translate(f"{statement[:into.start()]}{values} RETURNING {columns}"), params).fetchall()
+            if rows:
+                self._connection._db.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+            return None
+        self._cursor.execute(translate(statement), params)
+        return self._cursor.description
+
+    def executemany(self, sql: str, seq_of_params):
+        self._round_trip()
+        self._pending = []  # fast_executemany envía el lote completo en una sola ida y vuelta
+        try:
+            self._cursor.executemany(translate(sql), [tuple(p) for p in seq_of_params])
+        except sqlite3.IntegrityError as e:
+            raise pyodbc.IntegrityError("23000", str(e)) from e
+        except sqlite3.Error as e:
+            raise pyodbc.Error("HY000", str(e)) from e
+        self._description = None
+
+    def _set_description(self, description):
+        if description is None:
+            self._description = self._index = None
+        else:
+            self._description = tuple((d[0], None, None, None, None, None, True) for d in description)
+            self._index = {d[0]: i for i, d in enumerate(description)}
+
+    def _wrap(self, values):
+        return None if values is None else Row(values, self._description, self._index)
+
+    def fetchone(self):
+        if self._output is not None:
+            return self._wrap(next(self._output, None))
+        return self._wrap(self._cursor.fetchone())
+
+    def fetchmany(self, size: int = 1):
+        if self._output is not None:
+            return [self._wrap(values) for values in itertools.islice(self._output, size)]
+        return [self._wrap(values) for values in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        if self._output is not None:
+            return [self._wrap(values) for values in self._output]
+        return [self._wrap(values) for values in self._cursor.fetchall()]
+
+    def close(self):
+        self._pending = []
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path: str, latency: float):
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._latency = latency
+        self._in_transaction = False
+        self._nocount = False   # SET NOCOUNT dura lo que la sesión, no el lote
+        self.autocommit = False
+
+    def _round_trip(self):
+        stats.round_trip()
+        if self._latency:
+            time.sleep(self._latency)
+        record_phase("db_roundtrip", self._latency)
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self._round_trip()
+        self._in_transaction = False
+        self._db.commit()
+
+    def rollback(self):
+        # Solo es gratis si no se ejecutó nada desde el último commit/rollback: tras un SELECT
+        # el rollback que hace el pool al devolver la conexión sí es una ida y vuelta
+        if self._in_transaction:
+            self._round_trip()
+            self._in_transaction = False
+        if self._db.in_transaction:
+            self._db.rollback()
+
+    def close(self):
+        self._db.close()
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.round_trips = 0
+        self.connects = 0
+
+    def round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+
+    def connect(self):
+        with self._lock:
+            self.connects += 1
+
+
+stats = _Stats()
+
+
+def create_database(path: str):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    db.commit()
+    db.close()
+
+
+def connector(path: str, latency_ms: float = 0.5, connect_latency_ms: float = 20.0):
+    """Devuelve un callable para database.configure_pool(connect=...)."""
+    def connect():
+        stats.connect()
+        if connect_latency_ms:
+            time.sleep(connect_latency_ms / 1000)
+        return Connection(path, latency_ms / 1000)
+    return connect
@@ -0,0 +1,92 @@
+# bench/mapping.py
+"""
+Micro-benchmark del mapeo fila -> UserInDB -> respuesta JSON de /users/me.
+
+Compara, por operación y en el mismo proceso:
+
+    - antes: dict(zip(...)) + UserInDB validado + rol_map + UserPublic
+      validado y re-validado por response_model + jsonable_encoder + json
+    - ahora: app.mappers (model_construct con mapper precompilado) +
+      user_public_dict + orjson
+
+Solo mide CPU (no hay BBDD ni red). Uso:
+    python -m bench.mapping
+    python -m bench.mapping --iterations 200000
+"""
+
+import argparse
+import json
+import time
+from datetime import date, datetime
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app.mappers import map_row, user_public_dict
+from app.models import UserInDB, UserPublic
+from bench.fakedb import Row
+
+COLUMNS = (
+    ("id_usuario", int), ("nombres", str), ("primer_apellido", str), ("segundo_apellido", str),
+    ("rut", str), ("correo", str), ("contrasena", str), ("direccion", str), ("id_rol", int),
+    ("estado", str), ("foto_url", str), ("genero", str), ("fecha_nacimiento", date),
+    ("token_valido_desde", datetime),
+)
+DESCRIPTION = tuple((name, type_, None, None, None, None, True) for name, type_ in COLUMNS)
+VALUES = (
+    4242, "Bench", "Usuario", "Mapeo", "12345678-5", "bench@example.com",
+    "$2b$12$" + "x" * 53, "Av. Siempre Viva 742", 1, "activo",
+    "https://example.com/default.png", "otro", date(1990, 5, 17), datetime(2024, 1, 1, 12, 0, 0),
+)
+
+
+def make_row() -> Row:
+    return Row(VALUES, DESCRIPTION, {name: i for i, (name, _) in enumerate(COLUMNS)})
+
+
+def legacy(row) -> bytes:
+    user = UserInDB(**dict(zip([column[0] for column in row.cursor_description], row)))
+    rol_map = {0: "administrador", 1: "cliente", 2: "prestador", 3: "híbrido"}
+    public = UserPublic(
+        id=str(user.id_usuario), nombres=user.nombres, primer_apellido=user.primer_apellido,
+        segundo_apellido=user.segundo_apellido, rut=user.rut, correo=user.correo, direccion=user.direccion,
+        rol=rol_map.get(user.id_rol, "desconocido"), foto_url=user.foto_url, genero=user.genero,
+        fecha_nacimiento=user.fecha_nacimiento,
+    )
+    # Lo que hacía FastAPI con response_model=UserPublic y JSONResponse
+    validated = UserPublic.model_validate(public.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode()
+
+
+def current(row) -> bytes:
+    return orjson.dumps(user_public_dict(map_row(UserInDB, row)))
+
+
+def measure(fn, row, iterations: int) -> float:
+    """Microsegundos por operación (mejor de 3 corridas)."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.process_time()
+        for _ in range(iterations):
+            fn(row)
+        best = min(best, time.process_time() - start)
+    return best / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark del mapeo fila -> respuesta de /users/me")
+    parser.add_argument("--iterations", type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    row = make_row()
+    if json.loads(legacy(row)) != json.loads(current(row)):
+        raise SystemExit("Las dos rutas producen JSON distinto")
+
+    before = measure(legacy, row, args.iterations)
+    after = measure(current, row, args.iterations)
+    print(f"antes: {before:8.2f} µs/op")
+    print(f"ahora: {after:8.2f} µs/op   ({(1 - after / before) * 100:.0f}% menos CPU)")
+
+
+if __name__ == "__main__":
+    main()
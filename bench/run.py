@@ -0,0 +1,294 @@
+# bench/run.py
+"""
+Benchmark de carga reproducible para /auth/login, /auth/register y /users/me.
+
+Levanta la app en proceso (httpx + ASGITransport, sin red ni uvicorn) contra
+bench.fakedb, una BBDD SQLite que imita Usuarios/Perfil con latencia de red
+simulada, y la recorre con una mezcla configurable de operaciones y N
+clientes concurrentes. Informa por operación:
+
+    - throughput (req/s) y latencia p50/p95/p99 vista por el cliente
+    - fracción del tiempo de servidor gastada en bcrypt
+    - idas y vueltas a la BBDD por request
+
+Los resultados se guardan en JSON (con el commit de git) para compararlos
+entre versiones con bench.compare.
+
+Uso (dependencias extra en bench/requirements.txt):
+    pip install -r bench/requirements.txt
+    python -m bench.run
+    python -m bench.run --concurrency 64 --duration 30 --mix login=2,register=1,me=7
+    python -m bench.compare bench/results/antes.json bench/results/despues.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+SCENARIOS = {
+    # nombre: (ruta registrada en la app, status esperado)
+    "login": ("/auth/login", 200),
+    "register": ("/auth/register", 201),
+    "me": ("/users/me", 200),
+}
+PASSWORD = "benchmark-123"
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Operación desconocida: {name} (válidas: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def rut_con_dv(cuerpo: int) -> str:
+    suma, multiplo = 0, 2
+    for d in reversed(str(cuerpo)):
+        suma += int(d) * multiplo
+        multiplo = 2 if multiplo == 7 else multiplo + 1
+    resto = 11 - (suma % 11)
+    return f"{cuerpo}-{'0' if resto == 11 else 'K' if resto == 10 else resto}"
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    k = (len(values) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def seed_users(path: str, count: int, hashed: str) -> list[str]:
+    """Inserta `count` clientes activos con la misma contraseña y devuelve sus correos."""
+    import sqlite3
+
+    correos = [f"bench{i}@example.com" for i in range(count)]
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO Usuarios (rut, nombres, primer_apellido, correo, contrasena, id_rol, estado, token_valido_desde) "
+        "VALUES (?, 'Bench', 'Usuario', ?, ?, 1, 'activo', '2000-01-01 00:00:00')",
+        [(rut_con_dv(10_000_000 + i), correo, hashed) for i, correo in enumerate(correos)],
+    )
+    db.execute("INSERT INTO Perfil (id_usuario) SELECT id_usuario FROM Usuarios")
+    db.commit()
+    db.close()
+    return correos
+
+
+class Workload:
+    def __init__(self, client, mix: dict, login_users: list, tokens: list, seed: int):
+        self.client = client
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.login_users = itertools.cycle(login_users)
+        self.tokens = tokens
+        self.rng = random.Random(seed)
+        self.next_rut = itertools.count(20_000_000)
+        self.latencies = {name: [] for name in SCENARIOS}
+        self.statuses = {name: {} for name in SCENARIOS}
+
+    def request(self, name: str):
+        if name == "login":
+            return self.client.post("/auth/login", data={"username": next(self.login_users), "password": PASSWORD})
+        if name == "register":
+            n = next(self.next_rut)
+            return self.client.post("/auth/register", json={
+                "rut": rut_con_dv(n), "nombres": "Nuevo", "primer_apellido": "Cliente",
+                "correo": f"nuevo{n}@example.com", "password": PASSWORD,
+            })
+        token = self.rng.choice(self.tokens)
+        return self.client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+    async def worker(self, deadline: float, record: bool):
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            start = time.perf_counter()
+            response = await self.request(name)
+            elapsed = time.perf_counter() - start
+            if record:
+                self.latencies[name].append(elapsed)
+                codes = self.statuses[name]
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+    async def run(self, seconds: float, concurrency: int, record: bool = True) -> float:
+        start = time.perf_counter()
+        deadline = start + seconds
+        await asyncio.gather(*(self.worker(deadline, record) for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+def summarize(workload: Workload, wall: float, snapshot: dict) -> dict:
+    histograms, counters = snapshot["histograms"], snapshot["counters"]
+    scenarios = {}
+    for name, (route, expected) in SCENARIOS.items():
+        latencies = sorted(workload.latencies[name])
+        if not latencies:
+            continue
+        server_time = sum(total for (metric, labels), (total, _) in histograms.items()
+                          if metric == "auth_request_duration_seconds" and ("route", route) in labels)
+        requests = sum(count for (metric, labels), (_, count) in histograms.items()
+                       if metric == "auth_request_duration_seconds" and ("route", route) in labels)
+        bcrypt = histograms.get(("auth_phase_duration_seconds", (("route", route), ("phase", "bcrypt"))), (0.0, 0))[0]
+        round_trips = counters.get(("auth_phase_calls_total", (("route", route), ("phase", "db_roundtrip"))), 0)
+        statuses = workload.statuses[name]
+        scenarios[name] = {
+            "requests": len(latencies),
+            "errors": len(latencies) - statuses.get(expected, 0),
+            "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+            "throughput": len(latencies) / wall,
+            "latency_ms": {
+                "mean": sum(latencies) / len(latencies) * 1000,
+                "p50": percentile(latencies, 0.50) * 1000,
+                "p95": percentile(latencies, 0.95) * 1000,
+                "p99": percentile(latencies, 0.99) * 1000,
+                "max": latencies[-1] * 1000,
+            },
+            "bcrypt_share": bcrypt / server_time if server_time else 0.0,
+            "db_round_trips_per_request": round_trips / requests if requests else 0.0,
+        }
+    total = sum(s["requests"] for s in scenarios.values())
+    return {"requests": total, "throughput": total / wall, "wall_seconds": wall, "scenarios": scenarios}
+
+
+def print_report(result: dict):
+    overall = result["overall"]
+    print(f"\n{overall['requests']} requests en {overall['wall_seconds']:.1f}s -> {overall['throughput']:.1f} req/s"
+          f"  (commit {result['meta']['commit']}{' +cambios' if result['meta']['dirty'] else ''})")
+    print(f"{'operación':<10} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'bcrypt':>7} {'rt/req':>7}")
+    for name, s in overall["scenarios"].items():
+        lat = s["latency_ms"]
+        print(f"{name:<10} {s['requests']:>7} {s['errors']:>5} {s['throughput']:>8.1f} {lat['p50']:>8.1f} {lat['p95']:>8.1f}"
+              f" {lat['p99']:>8.1f} {s['bcrypt_share']:>6.0%} {s['db_round_trips_per_request']:>7.2f}")
+    db = result["database"]
+    print(f"BBDD: {db['round_trips']} idas y vueltas, {db['connects']} conexiones abiertas;"
+          f" bcrypt: {result['hasher']['completed']} operaciones, {result['hasher']['rejected']} rechazadas")
+
+
+async def main_async(args):
+    from bench import fakedb
+
+    fakedb.create_database(args.db_path)
+    from app.hashing import pwd_context
+    correos = seed_users(args.db_path, args.users, pwd_context.hash(PASSWORD))
+
+    from app.database import configure_pool
+    from app.hashing import hasher
+    from app.main import app
+    from app.metrics import registry
+    import httpx
+
+    pool_options = {"max_size": args.pool_size} if args.pool_size else {}
+    configure_pool(fakedb.connector(args.db_path, args.db_latency_ms, args.connect_latency_ms), **pool_options)
+
+    # Usuarios disjuntos: un login invalida los tokens anteriores de ese usuario (token_valido_desde)
+    half = len(correos) // 2
+    login_users, me_users = correos[:half], correos[half:]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        tokens = []
+        for correo in me_users:
+            response = await client.post("/auth/login", data={"username": correo, "password": PASSWORD})
+            response.raise_for_status()
+            tokens.append(response.json()["token"])
+
+        workload = Workload(client, args.mix, login_users, tokens, args.seed)
+        if args.warmup:
+            await workload.run(args.warmup, args.concurrency, record=False)
+
+        registry.reset()
+        hasher_before = hasher.stats()
+        db_before = (fakedb.stats.round_trips, fakedb.stats.connects)
+        wall = await workload.run(args.duration, args.concurrency)
+        snapshot = registry.snapshot()
+        hasher_after = hasher.stats()
+
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup,
+                "mix": args.mix, "users": args.users, "seed": args.seed, "pool_size": args.pool_size,
+                "db_latency_ms": args.db_latency_ms, "connect_latency_ms": args.connect_latency_ms,
+                "env": {key: os.environ[key] for key in sorted(os.environ)
+                        if key.startswith(("DB_POOL_", "HASH_", "USER_CACHE_", "LOGIN_", "TOKEN_MODE", "JWT_ALGORITHM"))},
+            },
+        },
+        "overall": summarize(workload, wall, snapshot),
+        "hasher": {
+            "completed": hasher_after["completed"] - hasher_before["completed"],
+            "rejected": hasher_after["rejected"] - hasher_before["rejected"],
+            "hash_time_total": hasher_after["hash_time_total"] - hasher_before["hash_time_total"],
+        },
+        "database": {
+            "round_trips": fakedb.stats.round_trips - db_before[0],
+            "connects": fakedb.stats.connects - db_before[1],
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de login, registro y /users/me contra una BBDD local")
+    parser.add_argument("--concurrency", type=int, default=32, help="clientes concurrentes")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de medición")
+    parser.add_argument("--warmup", type=float, default=3.0, help="segundos de calentamiento sin medir")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("login=2,register=1,me=7"),
+                        help="pesos por operación, p.ej. login=2,register=1,me=7")
+    parser.add_argument("--users", type=int, default=200, help="usuarios sembrados (mitad para login, mitad para /users/me)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--pool-size", type=int, help="DB_POOL_MAX_SIZE para la corrida")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="latencia simulada por ida y vuelta")
+    parser.add_argument("--connect-latency-ms", type=float, default=20.0, help="latencia simulada al abrir una conexión")
+    parser.add_argument("--output", default=os.path.join("bench", "results"), help="directorio de resultados JSON")
+    args = parser.parse_args(argv)
+
+    # La app lee su configuración al importarse; basta con que existan estos valores
+    os.environ.setdefault("DATABASE_CONNECTION_STRING", "bench-fakedb")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ["METRICS_ENABLED"] = "1"
+    # Todos los clientes simulados comparten IP; sin esto se mediría el límite de login, no el servicio
+    os.environ.setdefault("LOGIN_THROTTLE_ENABLED", "0")
+
+    with tempfile.TemporaryDirectory(prefix="auth-bench-") as tmp:
+        args.db_path = os.path.join(tmp, "bench.sqlite3")
+        result = asyncio.run(main_async(args))
+
+    print_report(result)
+    os.makedirs(args.output, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(args.output, f"{stamp}-{result['meta']['commit'] or 'nogit'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
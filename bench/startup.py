@@ -0,0 +1,114 @@
+# bench/startup.py
+"""
+Arranque en frío: cuánto tarda una instancia nueva en importar app.main, en
+quedar lista (/health/ready) y en responder su primer login (comparado con
+el segundo, que ya encuentra todo caliente).
+
+Cada corrida es un intérprete nuevo contra bench.fakedb (con la latencia de
+conexión simulada), así que se paga todo lo que paga una instancia recién
+escalada. Compara los modos de WARMUP_MODE:
+
+    - off:        listo de inmediato; el primer login abre la conexión,
+                  inicializa bcrypt y jose
+    - background: el primer login llega cuando /health/ready ya dio 200
+
+Uso:
+    python -m bench.startup
+    python -m bench.startup --runs 5 --modes off,background,blocking
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.run import PASSWORD, percentile, seed_users
+
+
+def child(db_path: str, connect_latency_ms: float):
+    """Una instancia: se ejecuta en su propio intérprete."""
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    from fastapi.testclient import TestClient
+    from app.database import configure_pool
+    from bench import fakedb
+
+    configure_pool(fakedb.connector(db_path, 0.5, connect_latency_ms))
+    with TestClient(app) as client:   # corre el lifespan
+        lifespan_done = time.perf_counter()
+        while True:
+            ready = client.get("/health/ready")
+            if ready.status_code == 200:
+                break
+            time.sleep(0.005)
+        ready_at = time.perf_counter()
+        logins = []
+        for _ in range(2):
+            start = time.perf_counter()
+            response = client.post("/auth/login", data={"username": "bench0@example.com", "password": PASSWORD})
+            response.raise_for_status()
+            logins.append(time.perf_counter() - start)
+    print(json.dumps({
+        "import": imported - started,
+        "lifespan": lifespan_done - imported,
+        "ready": ready_at - started,
+        "first_login": logins[0],
+        "second_login": logins[1],
+        "reported": ready.json(),
+    }))
+
+
+def run(mode: str, db_path: str, connect_latency_ms: float) -> dict:
+    env = {
+        **os.environ,
+        "WARMUP_MODE": mode,
+        "DATABASE_CONNECTION_STRING": "bench-fakedb",
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "bench-secret"),
+        "LOGIN_THROTTLE_ENABLED": "0",
+    }
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", db_path, "--connect-latency-ms", str(connect_latency_ms)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío y primer login por WARMUP_MODE")
+    parser.add_argument("--runs", type=int, default=3, help="corridas por modo")
+    parser.add_argument("--modes", default="off,background")
+    parser.add_argument("--connect-latency-ms", type=float, default=20.0, help="latencia simulada al abrir una conexión")
+    parser.add_argument("--child", metavar="DB_PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child, args.connect_latency_ms)
+        return 0
+
+    from bench import fakedb
+    from app.hashing import pwd_context
+
+    with tempfile.TemporaryDirectory(prefix="auth-startup-") as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        fakedb.create_database(db_path)
+        seed_users(db_path, 1, pwd_context.hash(PASSWORD))
+
+        print(f"{'modo':<11} {'import':>9} {'lifespan':>9} {'listo':>9} {'1er login':>10} {'2do login':>10}"
+              f"   (mediana de {args.runs}, ms)")
+        for mode in args.modes.split(","):
+            results = [run(mode, db_path, args.connect_latency_ms) for _ in range(args.runs)]
+            columns = [sorted(r[key] for r in results)
+                       for key in ("import", "lifespan", "ready", "first_login", "second_login")]
+            print(f"{mode:<11} " + " ".join(f"{percentile(values, 0.5) * 1000:9.1f}" for values in columns[:3])
+                  + "".join(f" {percentile(values, 0.5) * 1000:10.1f}" for values in columns[3:]))
+            print(f"{'':<11} calentamiento: {results[-1]['reported']['checks']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
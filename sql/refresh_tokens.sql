@@ -0,0 +1,19 @@
+-- Refresh tokens rotativos (TOKEN_MODE=stateless).
+-- Solo se guarda el SHA-256 del token; cada login inicia una "familia" nueva y
+-- cada /auth/refresh marca el token como usado e inserta su sucesor, que hereda
+-- el vencimiento de la familia. El servicio borra periódicamente las filas
+-- vencidas (REFRESH_PURGE_INTERVAL), usadas o no.
+
+CREATE TABLE RefreshTokens (
+    token_hash  BINARY(32)   NOT NULL,
+    id_usuario  INT          NOT NULL,
+    familia     BINARY(16)   NOT NULL,
+    expira      DATETIME2(0) NOT NULL,
+    usado       BIT          NOT NULL CONSTRAINT DF_RefreshTokens_usado DEFAULT 0,
+    CONSTRAINT PK_RefreshTokens PRIMARY KEY (token_hash),
+    CONSTRAINT FK_RefreshTokens_Usuarios FOREIGN KEY (id_usuario) REFERENCES Usuarios (id_usuario) ON DELETE CASCADE
+);
+
+CREATE INDEX IX_RefreshTokens_id_usuario ON RefreshTokens (id_usuario);
+CREATE INDEX IX_RefreshTokens_familia ON RefreshTokens (familia);
+CREATE INDEX IX_RefreshTokens_expira ON RefreshTokens (expira);